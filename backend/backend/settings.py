@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt.token_blacklist',
     'cart',
@@ -50,6 +51,8 @@ INSTALLED_APPS = [
     'users',
     'contact',
     'payments',
+    'outbox',
+    'jobs',
     'corsheaders',
 ]
 
@@ -120,7 +123,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # --- REST Framework ---
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -165,8 +168,18 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'JTI_CLAIM': 'jti',
+    # Adds the is_staff claim read by users.authentication.TokenUserAuthentication
+    'TOKEN_OBTAIN_SERIALIZER': 'users.api.serializers.TokenObtainPairWithClaimsSerializer',
 }
 
+# Seconds an authenticated user row is reused per process (users/authentication.py)
+JWT_USER_CACHE_TTL = int(os.environ.get("JWT_USER_CACHE_TTL", 30))
+JWT_USER_CACHE_MAX_ENTRIES = int(os.environ.get("JWT_USER_CACHE_MAX_ENTRIES", 10000))
+# Signup/login/password reset hash passwords on this many threads (users/api/hashing.py);
+# beyond PASSWORD_HASH_QUEUE_LIMIT waiting requests they answer 429
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", 16))
+
 # --- Email ---
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.environ.get("EMAIL_HOST", "smtp.gmail.com")
@@ -176,9 +189,79 @@ EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
 
+# Outbox delivery (run_mail_worker): failed sends are retried after
+# BASE * 2^(attempt - 1) seconds, capped at MAX, up to MAX_ATTEMPTS tries
+MAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("MAIL_OUTBOX_MAX_ATTEMPTS", 8))
+MAIL_OUTBOX_RETRY_BASE_SECONDS = int(os.environ.get("MAIL_OUTBOX_RETRY_BASE_SECONDS", 30))
+MAIL_OUTBOX_RETRY_MAX_SECONDS = int(os.environ.get("MAIL_OUTBOX_RETRY_MAX_SECONDS", 3600))
+
 # --- Frontend ---
 FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:5173")
 
 # --- Stripe ---
 STRIPE_PUBLISHABLE_KEY = os.environ.get("STRIPE_PUBLISHABLE_KEY")
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY")
+# Signing secret of the /api/payments/webhook/ endpoint (unsigned events are only accepted with DEBUG)
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+# Base URL of the Stripe API; set to a run_fake_stripe server for offline load tests
+STRIPE_API_BASE = os.environ.get("STRIPE_API_BASE")
+# API client (payments/stripe_client.py): seconds per attempt, retries of transient failures
+STRIPE_CONNECT_TIMEOUT = float(os.environ.get("STRIPE_CONNECT_TIMEOUT", 3))
+STRIPE_READ_TIMEOUT = float(os.environ.get("STRIPE_READ_TIMEOUT", 10))
+STRIPE_MAX_RETRIES = int(os.environ.get("STRIPE_MAX_RETRIES", 2))
+STRIPE_RETRY_BASE_DELAY = float(os.environ.get("STRIPE_RETRY_BASE_DELAY", 0.5))
+STRIPE_RETRY_MAX_DELAY = float(os.environ.get("STRIPE_RETRY_MAX_DELAY", 4))
+# Connections kept open to Stripe per process
+STRIPE_HTTP_POOL_SIZE = int(os.environ.get("STRIPE_HTTP_POOL_SIZE", 10))
+# Failed calls in a row that open the circuit, and seconds it stays open before a trial call
+STRIPE_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("STRIPE_CIRCUIT_FAILURE_THRESHOLD", 5))
+STRIPE_CIRCUIT_RESET_SECONDS = int(os.environ.get("STRIPE_CIRCUIT_RESET_SECONDS", 30))
+
+# Checkout status stream (Server-Sent Events): seconds before the server ends it (the
+# browser reconnects), seconds between keepalive comments, client reconnect delay in ms
+PAYMENT_STREAM_MAX_SECONDS = int(os.environ.get("PAYMENT_STREAM_MAX_SECONDS", 300))
+PAYMENT_STREAM_KEEPALIVE_SECONDS = int(os.environ.get("PAYMENT_STREAM_KEEPALIVE_SECONDS", 15))
+PAYMENT_STREAM_RETRY_MS = int(os.environ.get("PAYMENT_STREAM_RETRY_MS", 3000))
+# Seconds a stream token (the EventSource URL's stand-in for the JWT) can open a stream
+PAYMENT_STREAM_TOKEN_SECONDS = int(os.environ.get("PAYMENT_STREAM_TOKEN_SECONDS", 60))
+# reconcile_payments never looks further back than this for PaymentIntents that may still change
+PAYMENT_RECONCILE_MAX_LOOKBACK_DAYS = int(os.environ.get("PAYMENT_RECONCILE_MAX_LOOKBACK_DAYS", 7))
+# Stripe refund calls in flight at once for an admin batch refund
+REFUND_BATCH_CONCURRENCY = int(os.environ.get("REFUND_BATCH_CONCURRENCY", 8))
+
+# --- Admin dashboard ---
+# Seconds a computed /api/admin/dashboard/stats/ response is reused per `days` value
+DASHBOARD_STATS_CACHE_TTL = int(os.environ.get("DASHBOARD_STATS_CACHE_TTL", 60))
+
+# --- Order export ---
+# Rows fetched per round trip by the server-side cursor behind /api/admin/orders/export/
+ORDER_EXPORT_CHUNK_SIZE = int(os.environ.get("ORDER_EXPORT_CHUNK_SIZE", 2000))
+
+# --- Order tracking ---
+# Seconds a rendered /api/track/<order_number>/ payload is cached (invalidated on order save)
+ORDER_TRACKING_CACHE_TTL = int(os.environ.get("ORDER_TRACKING_CACHE_TTL", 300))
+
+# --- Stale order reaper ---
+# Pending, unpaid Stripe checkouts older than this are cancelled by reap_stale_orders
+STALE_ORDER_REAP_AFTER_HOURS = int(os.environ.get("STALE_ORDER_REAP_AFTER_HOURS", 24))
+
+# --- Order partitioning and archive ---
+# Future monthly partitions kept ready by partition_order_tables
+ORDER_PARTITION_MONTHS_AHEAD = int(os.environ.get("ORDER_PARTITION_MONTHS_AHEAD", 3))
+# Months of orders kept in the database; older partitions are archived to ORDER_ARCHIVE_DIR
+ORDER_ARCHIVE_RETENTION_MONTHS = int(os.environ.get("ORDER_ARCHIVE_RETENTION_MONTHS", 24))
+ORDER_ARCHIVE_DIR = os.environ.get("ORDER_ARCHIVE_DIR", os.path.join(BASE_DIR, 'order_archive'))
+
+# --- Background jobs (run_worker) ---
+# Failed jobs are retried after BASE * 2^(attempt - 1) seconds, capped at MAX
+JOB_RETRY_BASE_SECONDS = int(os.environ.get("JOB_RETRY_BASE_SECONDS", 10))
+JOB_RETRY_MAX_SECONDS = int(os.environ.get("JOB_RETRY_MAX_SECONDS", 3600))
+# Lease for jobs whose task is not registered in the claiming worker
+JOB_DEFAULT_LEASE_SECONDS = int(os.environ.get("JOB_DEFAULT_LEASE_SECONDS", 600))
+# Maximum jobs running at once per queue across all workers, e.g. "stripe=4,email=2"
+JOB_QUEUE_CONCURRENCY = {
+    name: int(limit)
+    for name, limit in (
+        item.split('=') for item in os.environ.get("JOB_QUEUE_CONCURRENCY", "").split(',') if item
+    )
+}
@@ -4,6 +4,7 @@ from products.models import Product
 from decimal import Decimal
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from . import pricing
 
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -23,24 +24,15 @@ class Cart(models.Model):
     
     def shipping_cost(self):
         """Calculate shipping cost based on subtotal"""
-        subtotal = self.subtotal()
-        if subtotal >= 100:  # Free shipping over $100
-            return Decimal('0.00')
-        elif subtotal > 0:
-            return Decimal('10.00')
-        return Decimal('0.00')
+        return pricing.shipping_cost(self.subtotal())
     
     def tax_amount(self):
-        """Calculate tax (10% of subtotal)"""
-        return (self.subtotal() * Decimal('0.10')).quantize(Decimal('0.01'))
+        """Calculate tax on the subtotal"""
+        return pricing.tax_amount(self.subtotal())
     
     def total_amount(self):
         """Calculate final total including shipping, tax, and discount"""
-        subtotal = self.subtotal()
-        shipping = self.shipping_cost()
-        tax = self.tax_amount()
-        discount = self.discount_amount or Decimal('0')
-        return max(subtotal + shipping + tax - discount, Decimal('0'))
+        return pricing.price_totals(self.subtotal(), self.discount_amount)['total_amount']
 
     def __str__(self):
         return f"Cart for {self.user.username} ({self.total_items()} items)"
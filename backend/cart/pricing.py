@@ -0,0 +1,40 @@
+"""
+Checkout pricing shared by the cart, PlaceOrderView and the Stripe
+cart checkout, so every path charges the same amount for the same cart.
+"""
+from decimal import Decimal
+
+# Orders with a subtotal of at least this much ship for free
+FREE_SHIPPING_THRESHOLD = Decimal('100')
+FLAT_SHIPPING_COST = Decimal('10.00')
+TAX_RATE = Decimal('0.10')
+
+
+def shipping_cost(subtotal):
+    """Flat shipping below the free-shipping threshold, none for an empty cart"""
+    if subtotal >= FREE_SHIPPING_THRESHOLD or subtotal <= 0:
+        return Decimal('0.00')
+    return FLAT_SHIPPING_COST
+
+
+def tax_amount(subtotal):
+    """Tax on the subtotal, rounded to the cent"""
+    return (subtotal * TAX_RATE).quantize(Decimal('0.01'))
+
+
+def price_totals(subtotal, discount_amount=None):
+    """
+    All amounts of a checkout from its item subtotal and promo discount,
+    keyed like the Order fields they are stored in.
+    """
+    subtotal = Decimal(subtotal)
+    discount = Decimal(discount_amount or 0)
+    shipping = shipping_cost(subtotal)
+    tax = tax_amount(subtotal)
+    return {
+        'subtotal': subtotal,
+        'shipping_cost': shipping,
+        'tax_amount': tax,
+        'discount_amount': discount,
+        'total_amount': max(subtotal + shipping + tax - discount, Decimal('0')),
+    }
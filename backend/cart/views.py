@@ -1,12 +1,13 @@
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from decimal import Decimal
 from .models import Cart, CartItem
 from products.models import Product
+from users.authentication import TokenUserAuthentication
 from .serializers import (
     CartSerializer, CartSummarySerializer, AddToCartSerializer,
     UpdateQuantitySerializer, PromoCodeSerializer
@@ -211,11 +212,12 @@ def remove_promo_code(request):
         return Response({"error": "Cart not found"}, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['GET'])
+@authentication_classes([TokenUserAuthentication])
 @permission_classes([permissions.IsAuthenticated])
 def cart_items_count(request):
-    """Get quick cart items count for navbar"""
+    """Get quick cart items count for navbar (polled often, so the user comes from the token claims)"""
     try:
-        cart = Cart.objects.get(user=request.user)
+        cart = Cart.objects.get(user_id=request.user.id)
         return Response({"count": cart.total_items()}, status=status.HTTP_200_OK)
     except Cart.DoesNotExist:
         return Response({"count": 0}, status=status.HTTP_200_OK)
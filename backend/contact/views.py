@@ -1,4 +1,4 @@
-from django.core.mail import send_mail
+from django.db import transaction
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
@@ -9,6 +9,7 @@ from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from .models import ContactMessage
 from .serializers import ContactMessageSerializer, ContactMessageListSerializer
+from outbox.mail import queue_email
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,22 +24,15 @@ class ContactMessageCreateView(generics.CreateAPIView):
     permission_classes = [AllowAny]
 
     def perform_create(self, serializer):
-        contact_message = serializer.save()
-        
-        # Send email notification to admin
-        try:
+        # Both emails go to the outbox in the same transaction as the message;
+        # run_mail_worker sends them after the response has gone out
+        with transaction.atomic():
+            contact_message = serializer.save()
             self.send_admin_notification(contact_message)
-        except Exception as e:
-            logger.error(f"Failed to send admin notification email: {str(e)}")
-        
-        # Send confirmation email to user
-        try:
             self.send_user_confirmation(contact_message)
-        except Exception as e:
-            logger.error(f"Failed to send user confirmation email: {str(e)}")
 
     def send_admin_notification(self, contact_message):
-        """Send email notification to admin about new contact message"""
+        """Queue email notification to admin about new contact message"""
         subject = f"New Contact Message: {contact_message.subject}"
         
         # Create the email content
@@ -62,17 +56,16 @@ class ContactMessageCreateView(generics.CreateAPIView):
         
         plain_message = strip_tags(html_message)
         
-        send_mail(
+        queue_email(
             subject=subject,
             message=plain_message,
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[settings.EMAIL_HOST_USER],  # Send to admin email
             html_message=html_message,
-            fail_silently=False,
         )
 
     def send_user_confirmation(self, contact_message):
-        """Send confirmation email to user"""
+        """Queue confirmation email to user"""
         subject = f"We received your message: {contact_message.subject}"
         
         html_message = f"""
@@ -98,13 +91,12 @@ class ContactMessageCreateView(generics.CreateAPIView):
         
         plain_message = strip_tags(html_message)
         
-        send_mail(
+        queue_email(
             subject=subject,
             message=plain_message,
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[contact_message.email],
             html_message=html_message,
-            fail_silently=False,
         )
 
 class ContactMessageListView(generics.ListAPIView):
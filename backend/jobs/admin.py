@@ -0,0 +1,19 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import Job
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'queue', 'status', 'attempts', 'run_at', 'created_at', 'finished_at']
+    list_filter = ['status', 'queue', 'created_at']
+    search_fields = ['task', 'last_error']
+    readonly_fields = ['created_at', 'finished_at', 'locked_by', 'locked_until', 'last_error']
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        """Queue failed jobs again, starting now"""
+        updated = queryset.filter(status='failed').update(
+            status='queued', run_at=timezone.now(), attempts=0, finished_at=None
+        )
+        self.message_user(request, f'{updated} jobs queued again.')
+    retry_now.short_description = "Retry selected failed jobs now"
@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from django.core.management.base import BaseCommand
+from jobs import queue as job_queue
+from jobs import worker
+
+
+class Command(BaseCommand):
+    """
+    Run background jobs from the jobs table (see jobs/queue.py).
+
+    Usage:
+        python manage.py run_worker                                  # 'stripe' and 'default', 4 threads
+        python manage.py run_worker --queues email,stripe,default --concurrency 8
+        python manage.py run_worker --pool process --concurrency 2   # CPU-bound work
+        python manage.py run_worker --once                           # drain due jobs and exit
+
+    Queues: 'default' (order maintenance such as search text refreshes) and
+    'stripe' (webhook events, payments.tasks). A worker must serve 'stripe'
+    or received webhooks are stored but never applied.
+
+    Queue order in --queues is the claim priority. Stop with Ctrl+C / SIGINT:
+    running jobs finish, claimed jobs that did not start go back to the queue.
+    """
+    help = 'Run queued background jobs in a thread or process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queues', default='stripe,default',
+                            help='Comma-separated queues to work on, in priority order')
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at the same time')
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when no job is due')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        queues = [name.strip() for name in options['queues'].split(',') if name.strip()]
+        concurrency = options['concurrency']
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+        if options['pool'] == 'process':
+            # spawn rather than fork: children must not share this process's DB connection
+            pool = ProcessPoolExecutor(
+                max_workers=concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=worker.init_process,
+            )
+        else:
+            pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job')
+
+        self.stdout.write(f"Worker {worker_id} on {', '.join(queues)} ({options['pool']} x {concurrency})")
+        in_flight = {}
+        succeeded = failed = 0
+
+        try:
+            while True:
+                free = concurrency - len(in_flight)
+                if free > 0:
+                    for job in job_queue.claim(queues, free, worker_id):
+                        in_flight[pool.submit(worker.execute, job.id)] = job
+
+                if not in_flight:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(in_flight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = in_flight.pop(future)
+                    if future.exception() is None and future.result():
+                        succeeded += 1
+                    else:
+                        failed += 1
+                        self.stderr.write(f"Job {job.id} ({job.task}) failed, attempt {job.attempts}")
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping: waiting for running jobs...")
+        finally:
+            not_started = [job.id for future, job in in_flight.items() if future.cancel()]
+            pool.shutdown(wait=True)
+            if not_started:
+                job_queue.release(not_started, worker_id)
+
+        self.stdout.write(self.style.SUCCESS(f"Worker stopped. {succeeded} jobs succeeded, {failed} failed."))
@@ -0,0 +1,195 @@
+"""
+A small job queue on top of PostgreSQL.
+
+Defining and enqueueing work::
+
+    # myapp/tasks.py (autodiscovered by JobsConfig.ready)
+    from jobs.queue import task
+
+    @task(queue='email', max_attempts=3)
+    def send_digest(user_id):
+        ...
+
+    send_digest.enqueue(user.id)                      # as soon as possible
+    send_digest.enqueue(user.id, delay=3600)          # in an hour
+    enqueue('myapp.tasks.send_digest', user.id)       # by name
+
+Arguments are stored as JSON. ``enqueue`` writes the Job row in the current
+transaction, so work for a change never runs before (or without) the change.
+
+Running: ``python manage.py run_worker`` claims due jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` (workers never wait on each other's
+rows) and runs them in a thread or process pool. Each claim takes a lease of
+the task's ``timeout``; a job still marked running after its lease expired
+(worker killed) is claimed again, so tasks should be idempotent. Failed jobs
+are retried with exponential backoff until ``max_attempts``.
+
+Per-queue concurrency limits (JOB_QUEUE_CONCURRENCY) hold across all workers:
+claimers of a limited queue serialize on an advisory lock and only take as
+many jobs as there are free slots.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class Task:
+    """A registered background function; call it directly or ``.enqueue()`` it."""
+
+    def __init__(self, func, name, queue, max_attempts, timeout, priority):
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.priority = priority
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, run_at=None, delay=None, **kwargs):
+        return enqueue(self, *args, run_at=run_at, delay=delay, **kwargs)
+
+
+def task(queue='default', max_attempts=5, timeout=600, priority=0, name=None):
+    """
+    Register a function as a background task.
+    ``timeout`` is the lease in seconds: the job is considered abandoned and
+    run again if it has not finished by then.
+    """
+    def register(func):
+        task_name = name or f"{func.__module__}.{func.__name__}"
+        registered = Task(func, task_name, queue, max_attempts, timeout, priority)
+        _registry[task_name] = registered
+        return registered
+    return register
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f"Unknown task {name!r} - is its tasks module imported?")
+
+
+def enqueue(task, *args, run_at=None, delay=None, queue=None, priority=None, **kwargs):
+    """
+    Create a Job for ``task`` (a Task or a registered task name).
+    ``run_at`` (datetime) or ``delay`` (seconds) schedule it for later.
+    """
+    if isinstance(task, str):
+        task = get_task(task)
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+    return Job.objects.create(
+        queue=queue or task.queue,
+        task=task.name,
+        args=list(args),
+        kwargs=kwargs,
+        priority=task.priority if priority is None else priority,
+        run_at=run_at,
+        max_attempts=task.max_attempts,
+    )
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the given number of failed attempts."""
+    return min(settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_SECONDS)
+
+
+def _claimable(now):
+    return Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+
+
+def claim(queues, limit, worker_id):
+    """
+    Claim up to ``limit`` due jobs from ``queues`` for this worker.
+    Returns the claimed Job instances, already marked running.
+    """
+    claimed = []
+    limits = settings.JOB_QUEUE_CONCURRENCY
+    for queue in queues:
+        if len(claimed) >= limit:
+            break
+        with transaction.atomic():
+            now = timezone.now()
+            wanted = limit - len(claimed)
+            if limits.get(queue):
+                # Serialize claimers of this queue so the limit holds across workers
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"jobs:{queue}"])
+                running = Job.objects.filter(queue=queue, status='running', locked_until__gte=now).count()
+                wanted = min(wanted, limits[queue] - running)
+                if wanted <= 0:
+                    continue
+
+            jobs = list(
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(_claimable(now), queue=queue)
+                .order_by('-priority', 'run_at', 'id')[:wanted]
+            )
+            for job in jobs:
+                lease = _registry[job.task].timeout if job.task in _registry else settings.JOB_DEFAULT_LEASE_SECONDS
+                job.status = 'running'
+                job.attempts += 1
+                job.locked_by = worker_id
+                job.locked_until = now + timedelta(seconds=lease)
+            Job.objects.bulk_update(jobs, ['status', 'attempts', 'locked_by', 'locked_until'])
+            claimed.extend(jobs)
+    return claimed
+
+
+def execute(job_id):
+    """
+    Run one claimed job and record the outcome. Safe to call from a pool
+    thread or process; returns True if the job succeeded.
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.get(id=job_id)
+        try:
+            get_task(job.task).func(*job.args, **job.kwargs)
+        except Exception as e:
+            _record_failure(job, e)
+            return False
+
+        Job.objects.filter(id=job.id, locked_by=job.locked_by).update(
+            status='succeeded', finished_at=timezone.now(), locked_until=None, last_error=''
+        )
+        return True
+    finally:
+        close_old_connections()
+
+
+def _record_failure(job, error):
+    detail = ''.join(traceback.format_exception(error))
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        logger.error(f"Job {job.id} ({job.task}) failed for good after {job.attempts} attempts: {error}")
+        changes = {'status': 'failed', 'finished_at': now}
+    else:
+        delay = retry_delay(job.attempts)
+        logger.warning(f"Job {job.id} ({job.task}) failed, attempt {job.attempts}; retrying in {delay}s: {error}")
+        changes = {'status': 'queued', 'run_at': now + timedelta(seconds=delay)}
+    Job.objects.filter(id=job.id, locked_by=job.locked_by).update(
+        last_error=detail, locked_until=None, **changes
+    )
+
+
+def release(job_ids, worker_id):
+    """Hand back jobs a stopping worker claimed but never started."""
+    return Job.objects.filter(id__in=job_ids, status='running', locked_by=worker_id).update(
+        status='queued', locked_until=None, attempts=F('attempts') - 1
+    )
@@ -0,0 +1,15 @@
+"""
+Entry points for spawned pool processes. This module must stay importable
+before Django is set up, so it imports nothing that touches models.
+"""
+import django
+
+
+def init_process():
+    # Spawned processes start from scratch and need their own app registry
+    django.setup()
+
+
+def execute(job_id):
+    from .queue import execute as execute_job
+    return execute_job(job_id)
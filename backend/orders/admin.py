@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import Order, OrderItem, OrderStatusEvent
 
 """
 Django Admin Configuration for Orders App
@@ -20,6 +20,19 @@ class OrderItemInline(admin.TabularInline):
     extra = 0  # Don't show extra empty forms by default
     readonly_fields = ('subtotal',)  # Make subtotal field read-only (it's calculated)
 
+class OrderStatusEventInline(admin.TabularInline):
+    """
+    Read-only inline for the order's status history.
+    The event log is append-only, so nothing here can be added or edited.
+    """
+    model = OrderStatusEvent
+    extra = 0
+    can_delete = False
+    readonly_fields = ('from_status', 'to_status', 'source', 'actor', 'note', 'created_at')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """
@@ -46,7 +59,7 @@ class OrderAdmin(admin.ModelAdmin):
     
     # Include the OrderItem inline editor
     # This allows editing order items directly on the order page
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, OrderStatusEventInline]
     
     # Organize the form into logical sections using fieldsets
     # This makes the admin form cleaner and more organized
@@ -0,0 +1,186 @@
+"""
+Cold storage for monthly order partitions past the retention period.
+
+``archive_month()`` detaches the ``orders_order`` partition of a month and
+writes every order to ``<ORDER_ARCHIVE_DIR>/orders-YYYY-MM.jsonl.gz``:
+
+* each order is its own gzip member holding one JSON document: the
+  OrderSerializer payload shown to the customer, plus the raw rows of
+  everything that referenced the order (items, status events, payment)
+  or its payment (refunds);
+* the file is still a valid .gz (members concatenate), and an ArchivedOrder
+  row records each order's offset and length, so ``load_order()`` reads back
+  a single order without decompressing the whole month.
+
+The referencing rows are then deleted with plain SQL, which keeps them in
+the sales rollups, and the detached partition is dropped. Item partitions
+empty out as their orders are archived and are dropped once older than the
+retention period.
+
+If a run is interrupted, the detached partition is left behind and the next
+run picks it up again, rewriting the file from scratch.
+"""
+import gzip
+import json
+import os
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import ArchivedOrder, Order, OrderItem
+from .partitioning import attached_partitions, partition_month, partition_name
+from .serializers import OrderSerializer
+
+
+def archive_file_name(month):
+    return f"orders-{month:%Y-%m}.jsonl.gz"
+
+
+def archivable_months(before):
+    """
+    Months older than ``before`` that still have an order partition, attached
+    or left detached by an interrupted run.
+    """
+    table = Order._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND relname LIKE %s",
+            [f"{table}_p%"]
+        )
+        months = {partition_month(table, name) for (name,) in cursor.fetchall()}
+    return sorted(month for month in months if month and month < before)
+
+
+def _relations(model=Order, parent_lookup=None):
+    """
+    Every model holding a foreign key to Order, or to a model that does
+    (a payment's refunds), as ``(model, field, lookup of the order id)``;
+    parents come before their children.
+    """
+    relations = []
+    for relation in model._meta.related_objects:
+        if parent_lookup is None:
+            lookup = relation.field.attname
+        else:
+            lookup = f"{relation.field.name}__{parent_lookup}"
+        relations.append((relation.related_model, relation.field, lookup))
+        relations.extend(_relations(relation.related_model, lookup))
+    return relations
+
+
+def _related_rows(order_ids):
+    """Raw rows of every model referencing the orders (see _relations), keyed by (model, lookup)."""
+    related = {}
+    for model, field, lookup in _relations():
+        columns = [f.attname for f in model._meta.concrete_fields]
+        rows = model.objects.filter(**{f"{lookup}__in": order_ids}).order_by('pk').values(
+            *columns, archived_order_id=F(lookup)
+        )
+        related[(model, lookup)] = list(rows)
+    return related
+
+
+def archive_month(month, batch_size=500):
+    """
+    Move one month of orders to cold storage. Returns the number archived.
+    """
+    table = Order._meta.db_table
+    partition = partition_name(table, month)
+    file_name = archive_file_name(month)
+    path = os.path.join(settings.ORDER_ARCHIVE_DIR, file_name)
+    os.makedirs(settings.ORDER_ARCHIVE_DIR, exist_ok=True)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if month in attached_partitions(cursor, table):
+            # From here on the month is invisible to the app, so nothing can
+            # change these orders while they are being written out
+            cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{partition}"')
+
+    index = []
+    order_ids = []
+    with open(f"{path}.tmp", 'wb') as archive:
+        last_id = 0
+        while True:
+            orders = list(Order.objects.raw(
+                f'SELECT * FROM "{partition}" WHERE id > %s ORDER BY id LIMIT %s', [last_id, batch_size]
+            ).prefetch_related('items', 'user'))
+            if not orders:
+                break
+            last_id = orders[-1].id
+            ids = [order.id for order in orders]
+            related = _related_rows(ids)
+
+            for order in orders:
+                document = {
+                    'order': OrderSerializer(order).data,
+                    'related': {
+                        model._meta.label_lower: [
+                            {key: value for key, value in row.items() if key != 'archived_order_id'}
+                            for row in rows if row['archived_order_id'] == order.id
+                        ]
+                        for (model, lookup), rows in related.items()
+                    },
+                }
+                member = gzip.compress(json.dumps(document, cls=DjangoJSONEncoder).encode() + b'\n')
+                index.append(ArchivedOrder(
+                    order_id=order.id,
+                    order_number=order.order_number,
+                    user_id=order.user_id,
+                    created_at=order.created_at,
+                    archive_file=file_name,
+                    offset=archive.tell(),
+                    length=len(member),
+                ))
+                archive.write(member)
+            order_ids.extend(ids)
+        archive.flush()
+        os.fsync(archive.fileno())
+    if order_ids:
+        os.replace(f"{path}.tmp", path)
+    else:
+        os.remove(f"{path}.tmp")
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        ArchivedOrder.objects.filter(archive_file=file_name).delete()
+        ArchivedOrder.objects.bulk_create(index, batch_size=1000)
+        # Plain SQL rather than QuerySet.delete so the rollups keep these
+        # sales; children first, so no foreign key points at a deleted row
+        for model, field, lookup in reversed(_relations()):
+            if lookup == field.attname:
+                cursor.execute(
+                    f'DELETE FROM "{model._meta.db_table}" WHERE "{field.column}" = ANY(%s)',
+                    [order_ids]
+                )
+            elif order_ids:
+                rows = model.objects.filter(**{f"{lookup}__in": order_ids}).values('pk')
+                subquery, params = rows.query.sql_with_params()
+                cursor.execute(
+                    f'DELETE FROM "{model._meta.db_table}" WHERE "{model._meta.pk.column}" IN ({subquery})',
+                    params
+                )
+        cursor.execute(f'DROP TABLE "{partition}"')
+        _drop_empty_item_partitions(cursor, month)
+
+    return len(order_ids)
+
+
+def _drop_empty_item_partitions(cursor, through):
+    table = OrderItem._meta.db_table
+    for month in attached_partitions(cursor, table):
+        if month > through:
+            break
+        partition = partition_name(table, month)
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM "{partition}")')
+        if not cursor.fetchone()[0]:
+            cursor.execute(f'DROP TABLE "{partition}"')
+
+
+def load_order(archived):
+    """Read one archived order document back from its archive file."""
+    path = os.path.join(settings.ORDER_ARCHIVE_DIR, archived.archive_file)
+    with open(path, 'rb') as archive:
+        archive.seek(archived.offset)
+        member = archive.read(archived.length)
+    return json.loads(gzip.decompress(member))
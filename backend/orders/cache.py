@@ -0,0 +1,50 @@
+"""
+Small caching helpers shared by the orders views.
+
+``get_or_compute`` adds single-flight recomputation on top of Django's cache:
+when an entry expires only one caller rebuilds it while the others wait
+briefly for the fresh value, instead of all hitting the database at once.
+"""
+import time
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 30       # seconds a rebuild may hold the lock
+WAIT_INTERVAL = 0.05    # seconds between polls while another caller rebuilds
+WAIT_ATTEMPTS = 40      # give up waiting after ~2 seconds and compute directly
+
+
+def get_or_compute(key, compute, timeout):
+    """
+    Return the cached value for ``key``, calling ``compute()`` to fill it on a miss.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout=timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    # Someone else is rebuilding this entry - wait for their result
+    for _ in range(WAIT_ATTEMPTS):
+        time.sleep(WAIT_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+    return compute()
+
+
+def tracking_cache_key(order_number):
+    """Cache key of the public tracking payload for an order"""
+    return f"orders:tracking:{order_number}"
+
+
+def invalidate_tracking(*order_numbers):
+    """Drop cached tracking payloads, e.g. after a status change"""
+    cache.delete_many([tracking_cache_key(number) for number in order_numbers])
@@ -0,0 +1,23 @@
+"""
+PostgreSQL expressions used by the order analytics queries.
+"""
+from django.db.models import Aggregate, FloatField, Func
+
+
+class EpochSeconds(Func):
+    """Number of seconds in an interval, e.g. the difference of two timestamps"""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = FloatField()
+
+
+class Percentile(Aggregate):
+    """Continuous percentile (PERCENTILE_CONT) of an expression, 0 <= fraction <= 1"""
+    function = 'PERCENTILE_CONT'
+    name = 'Percentile'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        if not 0 <= fraction <= 1:
+            raise ValueError('fraction must be between 0 and 1')
+        super().__init__(expression, fraction=float(fraction), **extra)
@@ -0,0 +1,66 @@
+"""
+Time-ordered identifiers for orders and payments.
+
+``new_id()`` returns 20 Crockford base32 characters: 48 bits of Unix time in
+milliseconds followed by 50 random bits (a shortened ULID). Ids sort by
+creation time, so inserts land on the right-hand edge of the unique B-tree
+indexes instead of splitting pages all over them.
+
+Within a process ids are strictly increasing: another id in the same
+millisecond takes the previous random part plus one (ULID's monotonic mode),
+so a process can never repeat itself. Across processes uniqueness rests on
+the random part - two processes only collide if they draw the same 50-bit
+value in the same millisecond. Forked children reset the counter so they
+don't continue the parent's sequence in lockstep.
+
+orders.tests checks uniqueness across threads and processes;
+``python manage.py benchmark_identifiers`` compares insert throughput with
+random ids.
+"""
+import os
+import secrets
+import threading
+import time
+
+ENCODING = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+RANDOM_BITS = 50
+LENGTH = 20
+
+_lock = threading.Lock()
+_last_ms = -1
+_last_random = 0
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, index = divmod(value, 32)
+        chars.append(ENCODING[index])
+    return ''.join(reversed(chars))
+
+
+def new_id():
+    """Return a new time-sortable identifier (20 characters)."""
+    global _last_ms, _last_random
+    with _lock:
+        now = time.time_ns() // 1_000_000
+        if now > _last_ms:
+            random = secrets.randbits(RANDOM_BITS)
+        else:
+            # Same millisecond, or the clock stepped back: keep counting up
+            now = _last_ms
+            random = _last_random + 1
+            if random >> RANDOM_BITS:
+                now += 1
+                random = secrets.randbits(RANDOM_BITS)
+        _last_ms, _last_random = now, random
+    return _encode((now << RANDOM_BITS) | random, LENGTH)
+
+
+def _reset_after_fork():
+    global _lock, _last_ms
+    _lock = threading.Lock()
+    _last_ms = -1
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
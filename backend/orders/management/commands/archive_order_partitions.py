@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders import archive
+from orders.partitioning import add_months, month_start
+
+
+class Command(BaseCommand):
+    """
+    Archive monthly order partitions older than the retention period to
+    gzip files in ORDER_ARCHIVE_DIR and drop them from the database.
+
+    Usage:
+        python manage.py archive_order_partitions               # ORDER_ARCHIVE_RETENTION_MONTHS
+        python manage.py archive_order_partitions --months 36 --dry-run
+    """
+    help = 'Detach order partitions past the retention period and archive them to compressed files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.ORDER_ARCHIVE_RETENTION_MONTHS,
+                            help='Keep this many months (including the current one) in the database')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Only list the months that would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = add_months(month_start(timezone.now()), -(options['months'] - 1))
+        months = archive.archivable_months(before=cutoff)
+        if not months:
+            self.stdout.write(self.style.SUCCESS(f"Nothing to archive before {cutoff:%Y-%m}."))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(f"Would archive: {', '.join(f'{month:%Y-%m}' for month in months)}")
+            return
+
+        total = 0
+        for month in months:
+            archived = archive.archive_month(month, batch_size=options['batch_size'])
+            total += archived
+            if archived:
+                self.stdout.write(f"Archived {archived} orders from {month:%Y-%m} to {archive.archive_file_name(month)}")
+            else:
+                self.stdout.write(f"Dropped empty partition for {month:%Y-%m}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. {total} orders from {len(months)} months archived."))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    """
+    Fill Order.search_text for orders created before the column existed.
+
+    Usage: python manage.py backfill_order_search --batch-size 500
+    """
+    help = 'Populate the denormalized admin search column on orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true', help='Rebuild every order, not only empty ones')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Order.objects.select_related('user').order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(search_text='')
+
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+
+            for order in batch:
+                order.search_text = order.build_search_text(order.user)
+            Order.objects.bulk_update(batch, ['search_text'])
+
+            updated += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"Indexed {updated} orders...")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. {updated} orders updated."))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from orders.models import OrderItem
+
+
+class Command(BaseCommand):
+    """
+    Fill product_snapshot for order items created before snapshots existed.
+
+    Usage: python manage.py backfill_order_snapshots --batch-size 500
+    """
+    help = 'Capture product snapshots for order items that do not have one yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+        last_id = 0
+
+        while True:
+            # Walk by primary key so each batch is an index range scan
+            batch = list(
+                OrderItem.objects.filter(id__gt=last_id, product_snapshot={}, product__isnull=False)
+                .select_related('product__category')
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+
+            for item in batch:
+                item.product_snapshot = OrderItem.build_product_snapshot(item.product, sku=item.product_sku)
+            OrderItem.objects.bulk_update(batch, ['product_snapshot'])
+
+            updated += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"Backfilled {updated} order items...")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. {updated} order items now carry a product snapshot."))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    """
+    Set stock_reserved on orders placed before the flag existed.
+
+    Until then every order from PlaceOrderView took its units out of stock,
+    but the column defaults to False, so cancelling such an order would no
+    longer put them back. PlaceOrderView requires a shipping address while
+    cart checkouts (which never take stock up front) are created without
+    one, so the non-empty address tells them apart.
+
+    Run once after deploying the stock_reserved column:
+        python manage.py backfill_stock_reserved --batch-size 5000
+        python manage.py backfill_stock_reserved --dry-run
+    """
+    help = 'Mark pre-existing PlaceOrderView orders as having reserved stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would change')
+
+    def handle(self, *args, **options):
+        candidates = Order.objects.filter(stock_reserved=False).exclude(shipping_address='')
+        if options['dry_run']:
+            self.stdout.write(f"{candidates.count()} orders would be marked stock_reserved.")
+            return
+
+        batch_size = options['batch_size']
+        updated = 0
+        last_id = 0
+        while True:
+            # Walk by primary key so each batch is an index range scan
+            ids = list(candidates.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            updated += Order.objects.filter(id__in=ids, stock_reserved=False).update(stock_reserved=True)
+            last_id = ids[-1]
+            self.stdout.write(f"Backfilled {updated} orders...")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. {updated} orders marked stock_reserved."))
@@ -0,0 +1,54 @@
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.db import connection
+from orders.identifiers import new_id
+
+
+def _random_id():
+    # The scheme order numbers used before orders.identifiers
+    return uuid.uuid4().hex[:8].upper()
+
+
+class Command(BaseCommand):
+    """
+    Compare insert throughput into a unique B-tree index of
+    orders.identifiers against random ids. Uniqueness and ordering under
+    concurrency are checked by orders.tests.NewIdTests.
+
+    Usage:
+        python manage.py benchmark_identifiers
+        python manage.py benchmark_identifiers --rows 1000000
+    """
+    help = 'Benchmark index insert throughput of order/payment ids against random ids'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Rows inserted per scheme')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for name, generate in (('random hex (old)', _random_id), ('time-ordered', new_id)):
+            self.insert_benchmark(name, generate, options['rows'], options['batch_size'])
+
+    def insert_benchmark(self, name, generate, rows, batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS identifier_benchmark")
+            cursor.execute("CREATE TEMPORARY TABLE identifier_benchmark (id varchar(32) PRIMARY KEY)")
+            started = time.perf_counter()
+            for offset in range(0, rows, batch_size):
+                ids = [generate() for _ in range(min(batch_size, rows - offset))]
+                cursor.execute(
+                    "INSERT INTO identifier_benchmark (id) SELECT unnest(%s::varchar[]) ON CONFLICT DO NOTHING",
+                    [ids]
+                )
+            elapsed = time.perf_counter() - started
+            cursor.execute(
+                "SELECT count(*), pg_relation_size('identifier_benchmark_pkey') FROM identifier_benchmark"
+            )
+            stored, index_bytes = cursor.fetchone()
+            cursor.execute("DROP TABLE identifier_benchmark")
+
+        self.stdout.write(
+            f"{name}: {rows / elapsed:,.0f} rows/s, {rows - stored} collisions, "
+            f"index {index_bytes / 1024 / 1024:.1f} MB"
+        )
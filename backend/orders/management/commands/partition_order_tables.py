@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from orders import partitioning
+
+
+class Command(BaseCommand):
+    """
+    Convert orders_order and orders_orderitem to monthly range partitions
+    (once, in a maintenance window) and keep future months created.
+
+    Usage:
+        python manage.py partition_order_tables --convert   # one-off migration
+        python manage.py partition_order_tables             # monthly, from cron
+    """
+    help = 'Partition the order tables by created_at month and create upcoming partitions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Convert plain tables to partitioned ones (locks both tables)')
+        parser.add_argument('--ahead', type=int, default=settings.ORDER_PARTITION_MONTHS_AHEAD,
+                            help='Future months to keep a partition ready for')
+
+    def handle(self, *args, **options):
+        if options['convert']:
+            converted = partitioning.convert_tables(ahead=options['ahead'])
+            for table, partitions in converted.items():
+                self.stdout.write(f"Converted {table} into {partitions} monthly partitions.")
+            if not converted:
+                self.stdout.write("Order tables are already partitioned.")
+
+        created = partitioning.ensure_partitions(ahead=options['ahead'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {len(created)} new partitions" + (f": {', '.join(created)}" if created else '.')
+        ))
@@ -0,0 +1,38 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from orders import rollups
+
+
+class Command(BaseCommand):
+    """
+    Backfill or repair the daily sales rollups used by the admin dashboard.
+
+    Usage:
+        python manage.py rebuild_sales_rollups             # full history
+        python manage.py rebuild_sales_rollups --days 7    # last 7 days
+        python manage.py rebuild_sales_rollups --since 2025-01-01 --until 2025-01-31
+    """
+    help = 'Recompute daily order, product and customer rollups from the order tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Rebuild only the last N days')
+        parser.add_argument('--since', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Last date to rebuild (YYYY-MM-DD), defaults to today')
+
+    def handle(self, *args, **options):
+        try:
+            date_to = date.fromisoformat(options['until']) if options['until'] else None
+            date_from = date.fromisoformat(options['since']) if options['since'] else None
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        if options['days'] is not None:
+            date_from = timezone.localdate() - timedelta(days=options['days'])
+
+        written = rollups.rebuild(date_from=date_from, date_to=date_to)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rollups rebuilt: {written['order_stats']} order stat rows, "
+            f"{written['product_sales']} product rows, "
+            f"{written['customer_spend']} customer rows."
+        ))
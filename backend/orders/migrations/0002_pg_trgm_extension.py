@@ -0,0 +1,17 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    pg_trgm provides the gin_trgm_ops operator class of the orders_search_trgm
+    index on Order.search_text; it must exist before the index is created.
+    """
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.indexes import GinIndex
 from users.models import User
 from products.models import Product
+from django.utils import timezone
 from decimal import Decimal
-import uuid
+from .identifiers import new_id
 
 class Order(models.Model):
     """
@@ -24,6 +26,16 @@ class Order(models.Model):
         ('returned', 'Returned'),      # Order has been returned
     ]
 
+    # Statuses from which a customer (or the pending-order reaper) may cancel
+    CANCELLABLE_STATUSES = ('pending', 'confirmed')
+
+    # Timestamp column set the first time an order reaches each status
+    STATUS_TIMESTAMP_FIELDS = {
+        'confirmed': 'confirmed_at',
+        'shipped': 'shipped_at',
+        'delivered': 'delivered_at',
+    }
+
     PAYMENT_METHOD_CHOICES = [
         ('cash_on_delivery', 'Cash on Delivery'),
         ('credit_card', 'Credit Card'),
@@ -34,7 +46,7 @@ class Order(models.Model):
     ]
     
     # Unique order number for customer reference
-    order_number = models.CharField(max_length=20, unique=True, blank=True)
+    order_number = models.CharField(max_length=32, unique=True, blank=True)
     
     # Foreign key to User - each order belongs to one user
     # CASCADE means if user is deleted, their orders are also deleted
@@ -70,6 +82,12 @@ class Order(models.Model):
     # Order status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     
+    # True when placing the order took units out of product stock
+    # (PlaceOrderView). Cart checkouts never take stock, not even once
+    # paid, so cancelling or refunding them puts nothing back.
+    # Orders placed before this column: manage.py backfill_stock_reserved
+    stock_reserved = models.BooleanField(default=False)
+    
     # Financial details
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     shipping_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -87,12 +105,89 @@ class Order(models.Model):
     
     # Promo code used
     promo_code = models.CharField(max_length=50, blank=True)
+    
+    # Lower-cased copy of the searchable order and customer fields
+    # (order number, customer email/username/name, shipping address).
+    # Backed by a pg_trgm GIN index so admin search never joins users_user.
+    search_text = models.TextField(blank=True, editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded values so save() can update sales rollups by delta
+        from .rollups import ORDER_STATE_FIELDS, order_state
+        if all(field in instance.__dict__ for field in ORDER_STATE_FIELDS):
+            instance._rollup_state = order_state(instance)
+        return instance
 
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # Generate unique order number
-            self.order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-        super().save(*args, **kwargs)
+            # Time-ordered, so new rows append to the end of the unique index
+            self.order_number = f"ORD-{new_id()}"
+
+        from .rollups import ORDER_STATE_FIELDS, order_state, record_order_change
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = getattr(self, '_rollup_state', None)
+                if previous is None:
+                    stored = Order.objects.filter(pk=self.pk).only(*ORDER_STATE_FIELDS).first()
+                    previous = order_state(stored) if stored else None
+            # Refresh the search column when the customer is at hand (always
+            # true on create) so plain status updates don't load the user
+            if self._state.adding or not self.search_text or Order.user.is_cached(self):
+                search_text = self.build_search_text(self.user)
+                if search_text != self.search_text:
+                    self.search_text = search_text
+                    if kwargs.get('update_fields') is not None:
+                        kwargs['update_fields'] = {*kwargs['update_fields'], 'search_text'}
+            super().save(*args, **kwargs)
+            self._rollup_state = record_order_change(previous, self)
+
+            # Append to the status event log on creation and on every transition
+            previous_status = previous['status'] if previous else ''
+            if previous_status != self.status:
+                context = getattr(self, '_status_event_context', {})
+                OrderStatusEvent.objects.create(
+                    order=self,
+                    from_status=previous_status,
+                    to_status=self.status,
+                    **context
+                )
+            self._status_event_context = {}
+
+            # Drop the cached public tracking payload once the change is visible
+            from .cache import invalidate_tracking
+            order_number = self.order_number
+            transaction.on_commit(lambda: invalidate_tracking(order_number))
+
+    def change_status(self, new_status, source='system', actor=None, note=''):
+        """
+        Move the order to new_status, stamping confirmed_at/shipped_at/delivered_at
+        the first time they are reached. The source, actor and note are recorded
+        on the OrderStatusEvent written by the next save().
+        Returns True if the status actually changed.
+        """
+        if new_status == self.status:
+            return False
+
+        self.status = new_status
+        timestamp_field = self.STATUS_TIMESTAMP_FIELDS.get(new_status)
+        if timestamp_field and not getattr(self, timestamp_field):
+            setattr(self, timestamp_field, timezone.now())
+        self._status_event_context = {'source': source, 'actor': actor, 'note': note}
+        return True
+
+    def build_search_text(self, user):
+        """Build the denormalized text matched by admin order search"""
+        parts = [
+            self.order_number,
+            user.email,
+            user.username,
+            f"{user.first_name} {user.last_name}".strip(),
+            self.shipping_address,
+        ]
+        return '\n'.join(part for part in parts if part).lower()
 
     def __str__(self):
         """String representation of the order for admin and debugging"""
@@ -120,7 +215,7 @@ class Order(models.Model):
 
     def can_be_cancelled(self):
         """Check if order can be cancelled"""
-        return self.status in ['pending', 'confirmed']
+        return self.status in self.CANCELLABLE_STATUSES
 
     def can_be_returned(self):
         """Check if order can be returned"""
@@ -156,6 +251,9 @@ class Order(models.Model):
             models.Index(fields=['order_number']),
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['status']),
+            # Needs the pg_trgm extension (CREATE EXTENSION pg_trgm, or
+            # TrigramExtension() in the migration that adds this index)
+            GinIndex(fields=['search_text'], opclasses=['gin_trgm_ops'], name='orders_search_trgm'),
         ]
 
 class OrderItem(models.Model):
@@ -167,13 +265,20 @@ class OrderItem(models.Model):
     
     # Foreign key to Order - each item belongs to one order
     # related_name='items' allows us to access order.items.all()
+    # Partitioning orders_order replaces the database constraint with a
+    # trigger doing the same check (orders/partitioning.py)
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     
     # Foreign key to Product - each item references one product
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # SET_NULL keeps the order history intact if the product is deleted later;
+    # everything needed for display lives in product_snapshot below
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
     
     # Positive integer for quantity (can't be negative)
     quantity = models.PositiveIntegerField()
+    # Units given back through refunds (payments.Refund); they no longer
+    # count as sold stock, so cancelling the order does not restock them
+    refunded_quantity = models.PositiveIntegerField(default=0)
     
     # Price at the time of order (important for price history)
     # We store the price here so if product price changes later,
@@ -184,6 +289,10 @@ class OrderItem(models.Model):
     product_title = models.CharField(max_length=255)
     product_sku = models.CharField(max_length=100, blank=True)
     
+    # Compact, immutable copy of the product's display fields at order time
+    # Serializers render from this so order pages never join products_product
+    product_snapshot = models.JSONField(default=dict, blank=True)
+    
     # Item-specific status (for partial fulfillment)
     is_fulfilled = models.BooleanField(default=False)
     fulfilled_at = models.DateTimeField(null=True, blank=True)
@@ -192,9 +301,45 @@ class OrderItem(models.Model):
 
     def save(self, *args, **kwargs):
         # Store product details at time of order
-        if not self.product_title:
+        if self.product_id and not self.product_snapshot:
+            self.product_snapshot = self.build_product_snapshot(self.product, sku=self.product_sku)
+        if not self.product_title and self.product_id:
             self.product_title = self.product.title
-        super().save(*args, **kwargs)
+
+        from .rollups import ITEM_STATE_FIELDS, item_state, record_item_change
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = getattr(self, '_rollup_state', None)
+                if previous is None:
+                    stored = OrderItem.objects.filter(pk=self.pk).only(*ITEM_STATE_FIELDS).first()
+                    previous = item_state(stored) if stored else None
+            super().save(*args, **kwargs)
+            self._rollup_state = record_item_change(previous, self)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        from .rollups import ITEM_STATE_FIELDS, item_state
+        if all(field in instance.__dict__ for field in ITEM_STATE_FIELDS):
+            instance._rollup_state = item_state(instance)
+        return instance
+
+    @staticmethod
+    def build_product_snapshot(product, sku=''):
+        """
+        Capture the product fields needed to render an order line.
+        The image is stored as its storage name so the URL can be rebuilt
+        for whatever host serves the response.
+        """
+        return {
+            'id': product.id,
+            'title': product.title,
+            'unit_price': str(product.unit_price),
+            'image': product.image.name if product.image else None,
+            'category': product.category.name if product.category_id else None,
+            'sku': sku,
+        }
 
     def __str__(self):
         """String representation showing quantity and product name"""
@@ -210,4 +355,145 @@ class OrderItem(models.Model):
         return self.quantity * self.price
 
     class Meta:
-        ordering = ['id']
\ No newline at end of file
+        ordering = ['id']
+
+class OrderStatusEvent(models.Model):
+    """
+    Append-only log of order status transitions.
+    One row is written by Order.save() whenever the status changes (including
+    the initial 'pending' on creation). Rows are never updated; the tracking
+    timeline and fulfillment latency stats are read from this table.
+    """
+
+    SOURCE_CHOICES = [
+        ('system', 'System'),
+        ('customer', 'Customer'),
+        ('admin', 'Admin'),
+        ('payment', 'Payment'),
+        ('webhook', 'Stripe Webhook'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_events')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='system')
+    # Who made the change (admin or customer), if anyone
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.order_id}: {self.from_status or '-'} -> {self.to_status}"
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['order', 'created_at']),
+            models.Index(fields=['to_status', 'created_at']),
+        ]
+
+
+# ===== SALES ROLLUPS =====
+# Daily aggregates maintained incrementally from Order/OrderItem saves
+# (see orders/rollups.py). The admin dashboard reads only these tables.
+
+class DailyOrderStats(models.Model):
+    """
+    Orders and revenue for one day, broken down by status, payment method
+    and payment state. Summing over a date range gives every overview figure.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+    is_paid = models.BooleanField(default=False)
+
+    # Plain integers so an out-of-window status change can go temporarily
+    # negative until rebuild_sales_rollups is run for that date
+    orders_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.status}/{self.payment_method}: {self.orders_count} orders"
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'status', 'payment_method', 'is_paid'],
+                name='unique_daily_order_stats'
+            )
+        ]
+
+
+class DailyProductSales(models.Model):
+    """
+    Units and revenue per product per day, keyed by order line creation date.
+    """
+    date = models.DateField()
+    # Plain id (no FK) so rollups outlive deleted products
+    product_id = models.BigIntegerField(null=True)
+    product_title = models.CharField(max_length=255)
+
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.product_title}: {self.units_sold} units"
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'product_id'],
+                name='unique_daily_product_sales'
+            )
+        ]
+
+
+class DailyCustomerSpend(models.Model):
+    """
+    Orders placed and amount spent per customer per day.
+    """
+    date = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_spend')
+
+    orders_count = models.IntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} user {self.user_id}: {self.total_spent}"
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'user'],
+                name='unique_daily_customer_spend'
+            )
+        ]
+
+
+class ArchivedOrder(models.Model):
+    """
+    Index of orders moved to cold storage by archive_order_partitions.
+    The order itself lives in a gzip file under ORDER_ARCHIVE_DIR; this row
+    records where, so UserOrderDetailView can still serve it (orders/archive.py).
+    """
+    order_id = models.BigIntegerField(unique=True)
+    order_number = models.CharField(max_length=32, db_index=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    created_at = models.DateTimeField()
+
+    # Archive file name and the byte range of this order's gzip member
+    archive_file = models.CharField(max_length=100)
+    offset = models.BigIntegerField()
+    length = models.IntegerField()
+
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.order_number} in {self.archive_file}"
+
+    class Meta:
+        ordering = ['-created_at']
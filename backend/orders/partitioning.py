@@ -0,0 +1,292 @@
+"""
+PostgreSQL declarative range partitioning of the order tables by month.
+
+``orders_order`` and ``orders_orderitem`` are partitioned on ``created_at``,
+one partition per calendar month (in the project time zone), named
+``<table>_pYYYY_MM``. Queries that filter on ``created_at`` (order history,
+admin list, dashboard drill-downs) only touch the months they need, and old
+months can be detached and archived as a whole (see ``orders/archive.py``).
+
+``convert_tables()`` is the one-off migration path from the plain tables.
+It runs in a single transaction under an exclusive lock, so schedule it in a
+maintenance window:
+
+* each table is renamed aside, recreated as ``PARTITION BY RANGE
+  (created_at)`` with the same columns, defaults and checks, and its rows are
+  copied into monthly partitions;
+* PostgreSQL requires the partition key in every unique constraint, so the
+  primary key becomes ``(id, created_at)`` (ids come from one sequence and
+  stay unique). ``UNIQUE (order_number, created_at)`` alone would let the
+  same number appear twice, so every single-column unique constraint also
+  gets a plain registry table (``<table>_<column>_registry``, the column as
+  its primary key) that a trigger inserts each new value into: a duplicate
+  fails with the usual IntegrityError, across all partitions and even
+  after the original month was archived;
+* for the same reason nothing can hold a foreign key to ``orders_order`` any
+  more. Each such constraint (items, status events, payment) is replaced by
+  a pair of deferred constraint triggers doing the same check at commit:
+  the referenced order must exist, and an order cannot be deleted while
+  rows still point at it. Django's ``on_delete`` handling keeps cascading
+  deletes. Unpartitioned installations keep their real foreign keys;
+* ids keep coming from a sequence seeded past the current maximum.
+
+Rows can only be inserted into an existing partition, so
+``ensure_partitions()`` must run regularly (``partition_order_tables`` from
+cron, monthly or more often) to keep ``ahead`` future months created.
+"""
+import re
+from datetime import date, datetime, time
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Order, OrderItem
+
+PARTITIONED_MODELS = (Order, OrderItem)
+PARTITION_KEY = 'created_at'
+
+
+def month_start(value):
+    """First day of the month containing ``value`` (a date or datetime)."""
+    if isinstance(value, datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def partition_month(table, name):
+    """Inverse of partition_name: the month of a partition, or None."""
+    match = re.fullmatch(rf"{re.escape(table)}_p(\d{{4}})_(\d{{2}})", name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def _bound(month):
+    return timezone.make_aware(datetime.combine(month, time.min), timezone.get_current_timezone())
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def attached_partitions(cursor, table):
+    """Months that currently have an attached partition of ``table``."""
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(%s)",
+        [table]
+    )
+    months = (partition_month(table, name) for (name,) in cursor.fetchall())
+    return sorted(month for month in months if month)
+
+
+def create_partition(cursor, table, month):
+    name = partition_name(table, month)
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)',
+        [_bound(month), _bound(add_months(month, 1))]
+    )
+    return name
+
+
+def ensure_partitions(ahead=3):
+    """
+    Create any missing partitions from the current month up to ``ahead``
+    months in the future. Returns the names of the partitions created.
+    """
+    first = month_start(timezone.now())
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            if not is_partitioned(cursor, table):
+                continue
+            existing = set(attached_partitions(cursor, table))
+            for offset in range(ahead + 1):
+                month = add_months(first, offset)
+                if month not in existing:
+                    created.append(create_partition(cursor, table, month))
+    return created
+
+
+def convert_tables(ahead=3):
+    """
+    Convert the plain order tables into partitioned ones (see module docs).
+    Tables that are already partitioned are left alone.
+    Returns ``{table: number of partitions created}``.
+    """
+    converted = {}
+    references = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            if not is_partitioned(cursor, table):
+                references += _drop_references(cursor, table)
+                converted[table] = _convert_table(cursor, table, ahead)
+        # Once every table is converted: a referencing table may have been
+        # recreated after its referenced one
+        for reference in references:
+            _create_reference_check(cursor, *reference)
+    return converted
+
+
+def _with_partition_key(definition):
+    """Add the partition key to the column list of a unique constraint/index."""
+    if PARTITION_KEY in definition:
+        return definition
+    return re.sub(r'\(([^()]*)\)', rf'(\1, {PARTITION_KEY})', definition, count=1)
+
+
+def _unique_column(definition):
+    """The column of a single-column ``UNIQUE (...)`` constraint, or None."""
+    match = re.fullmatch(r'UNIQUE \((\w+)\)', definition)
+    return match.group(1) if match else None
+
+
+def _create_unique_registry(cursor, table, column):
+    """
+    Keep ``column`` unique across all partitions: a plain table holding
+    every value ever used, filled by a trigger on the partitioned table.
+    """
+    registry = f"{table}_{column}_registry"
+    function = f"{registry}_insert"
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{registry}" (value text PRIMARY KEY)'
+    )
+    cursor.execute(
+        f'INSERT INTO "{registry}" (value) SELECT "{column}" FROM "{table}" ON CONFLICT DO NOTHING'
+    )
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION "{function}"() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' OR NEW."{column}" IS DISTINCT FROM OLD."{column}" THEN
+                INSERT INTO "{registry}" (value) VALUES (NEW."{column}");
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute(
+        f'CREATE TRIGGER "{function}" AFTER INSERT OR UPDATE OF "{column}" ON "{table}" '
+        f'FOR EACH ROW EXECUTE FUNCTION "{function}"()'
+    )
+    return registry
+
+
+def _drop_references(cursor, table):
+    """
+    Drop the foreign keys pointing at ``table``, which cannot survive
+    partitioning. Returns them as ``(table, column, referencing table,
+    referencing column)`` for _create_reference_check.
+    """
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE confrelid = to_regclass(%s) AND contype = 'f'",
+        [table]
+    )
+    references = []
+    for referencing_table, name, definition in cursor.fetchall():
+        match = re.match(r'FOREIGN KEY \((\w+)\) REFERENCES [\w."]+\((\w+)\)', definition)
+        cursor.execute(f'ALTER TABLE {referencing_table} DROP CONSTRAINT "{name}"')
+        references.append((table, match.group(2), referencing_table.strip('"'), match.group(1)))
+    return references
+
+
+def _create_reference_check(cursor, table, column, referencing_table, referencing_column):
+    """
+    Stand-in for a dropped foreign key: constraint triggers that, at commit
+    like Django's deferred foreign keys, reject a reference to a missing row
+    and the deletion of a row that is still referenced.
+    """
+    function = f"{referencing_table}_{referencing_column}_check"
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION "{function}"() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                -- Rows moved to another partition are deleted and inserted again
+                IF EXISTS (SELECT 1 FROM "{referencing_table}" WHERE "{referencing_column}" = OLD."{column}")
+                        AND NOT EXISTS (SELECT 1 FROM "{table}" WHERE "{column}" = OLD."{column}") THEN
+                    RAISE foreign_key_violation USING MESSAGE = format(
+                        '{table}.{column}=%s is still referenced from {referencing_table}', OLD."{column}"
+                    );
+                END IF;
+            ELSIF NEW."{referencing_column}" IS NOT NULL
+                    AND NOT EXISTS (SELECT 1 FROM "{table}" WHERE "{column}" = NEW."{referencing_column}") THEN
+                RAISE foreign_key_violation USING MESSAGE = format(
+                    '{referencing_table}.{referencing_column}=%s is not present in {table}', NEW."{referencing_column}"
+                );
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute(
+        f'CREATE CONSTRAINT TRIGGER "{function}" AFTER INSERT OR UPDATE OF "{referencing_column}" '
+        f'ON "{referencing_table}" DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION "{function}"()'
+    )
+    cursor.execute(
+        f'CREATE CONSTRAINT TRIGGER "{function}_delete" AFTER DELETE ON "{table}" '
+        f'DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION "{function}"()'
+    )
+
+
+def _convert_table(cursor, table, ahead):
+    old = f"{table}_unpartitioned"
+    sequence = f"{table}_id_part_seq"
+
+    # Remember the constraints and indexes before the old table goes away
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'f')",
+        [table]
+    )
+    constraints = cursor.fetchall()
+    constraint_names = {name for name, _, _ in constraints}
+    cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s", [table])
+    indexes = [(name, definition) for name, definition in cursor.fetchall() if name not in constraint_names]
+
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ({PARTITION_KEY})'
+    )
+    cursor.execute(f'CREATE SEQUENCE "{sequence}" OWNED BY "{table}".id')
+    cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN id SET DEFAULT nextval(%s)', [sequence])
+
+    cursor.execute(f'SELECT min({PARTITION_KEY}) FROM "{old}"')
+    oldest = cursor.fetchone()[0]
+    month = month_start(oldest or timezone.now())
+    last = add_months(month_start(timezone.now()), ahead)
+    partitions = 0
+    while month <= last:
+        create_partition(cursor, table, month)
+        partitions += 1
+        month = add_months(month, 1)
+
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+    cursor.execute(f'SELECT setval(%s, (SELECT COALESCE(max(id), 0) + 1 FROM "{table}"), false)', [sequence])
+    cursor.execute(f'DROP TABLE "{old}"')
+
+    # Recreate keys and indexes on the parent; they cascade to every partition
+    for name, kind, definition in constraints:
+        if kind == 'u' and _unique_column(definition):
+            _create_unique_registry(cursor, table, _unique_column(definition))
+        if kind in ('p', 'u'):
+            definition = _with_partition_key(definition)
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+    for name, definition in indexes:
+        if definition.startswith('CREATE UNIQUE'):
+            definition = _with_partition_key(definition)
+        cursor.execute(definition)
+
+    return partitions
@@ -0,0 +1,237 @@
+"""
+Incremental maintenance of the daily sales rollup tables.
+
+Order and OrderItem remember the values they were loaded with (``from_db``)
+and, after each save, hand the old and new state to this module. Only the
+difference is applied to the rollups, as ``F()`` increments, inside the same
+transaction as the order change. Deletes are handled through the post_delete
+receivers in ``orders/signals.py``.
+
+Writes that bypass ``save()`` must report their transitions themselves
+(``OrderService.set_status`` and ``OrderService.create_order`` do); anything
+else, such as raw SQL, is not tracked and
+``python manage.py rebuild_sales_rollups`` recomputes any date range from
+the order tables.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyCustomerSpend, DailyOrderStats, DailyProductSales, Order, OrderItem
+
+ORDER_STATE_FIELDS = ('created_at', 'status', 'payment_method', 'is_paid', 'total_amount', 'user_id')
+ITEM_STATE_FIELDS = ('created_at', 'product_id', 'product_title', 'quantity', 'price')
+
+
+def _day(value):
+    return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+def order_state(order):
+    """Return the rollup-relevant values of an order, or None if not persisted."""
+    if order.pk is None or order.created_at is None:
+        return None
+    return {
+        'date': _day(order.created_at),
+        'status': order.status,
+        'payment_method': order.payment_method,
+        'is_paid': order.is_paid,
+        'total_amount': Decimal(order.total_amount or 0),
+        'user_id': order.user_id,
+    }
+
+
+def item_state(item):
+    """Return the rollup-relevant values of an order line, or None if not persisted."""
+    if item.pk is None or item.created_at is None:
+        return None
+    return {
+        'date': _day(item.created_at),
+        'product_id': item.product_id,
+        'product_title': item.product_title,
+        'quantity': item.quantity,
+        'revenue': Decimal(item.quantity) * Decimal(item.price),
+    }
+
+
+def _bump(model, key, deltas, defaults=None):
+    """
+    Add ``deltas`` to the rollup row identified by ``key``, creating it if needed.
+    """
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+
+    increments = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**key).update(**increments):
+        return
+
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **(defaults or {}), **deltas)
+    except IntegrityError:
+        # Another transaction created the row first
+        model.objects.filter(**key).update(**increments)
+
+
+def _order_deltas(state, sign, stats, spend):
+    stats_key = (state['date'], state['status'], state['payment_method'], state['is_paid'])
+    stats[stats_key]['orders_count'] += sign
+    stats[stats_key]['revenue'] += sign * state['total_amount']
+
+    spend_key = (state['date'], state['user_id'])
+    spend[spend_key]['orders_count'] += sign
+    spend[spend_key]['total_spent'] += sign * state['total_amount']
+
+
+def record_order_change(previous, order):
+    """
+    Apply the difference between ``previous`` and the order's current state.
+    Returns the new state so the instance can remember it for its next save.
+    """
+    current = order_state(order)
+    apply_order_transitions([(previous, current)])
+    return current
+
+
+def record_order_deleted(order):
+    """Take a deleted order back out of the rollups."""
+    apply_order_transitions([(getattr(order, '_rollup_state', None) or order_state(order), None)])
+
+
+def apply_order_transitions(transitions):
+    """
+    Apply a batch of ``(previous, current)`` order states to the rollups.
+    Deltas are summed per rollup row first, so a set-based update of many
+    orders costs one increment per affected row rather than per order.
+    """
+    stats = defaultdict(lambda: {'orders_count': 0, 'revenue': Decimal('0')})
+    spend = defaultdict(lambda: {'orders_count': 0, 'total_spent': Decimal('0')})
+    for previous, current in transitions:
+        if previous == current:
+            continue
+        if previous:
+            _order_deltas(previous, -1, stats, spend)
+        if current:
+            _order_deltas(current, 1, stats, spend)
+
+    for (date, status, payment_method, is_paid), deltas in stats.items():
+        _bump(DailyOrderStats, {
+            'date': date, 'status': status,
+            'payment_method': payment_method, 'is_paid': is_paid,
+        }, deltas)
+    for (date, user_id), deltas in spend.items():
+        _bump(DailyCustomerSpend, {'date': date, 'user_id': user_id}, deltas)
+
+
+def record_item_change(previous, item):
+    """
+    Apply the difference between ``previous`` and the order line's current state.
+    """
+    current = item_state(item)
+    apply_item_transitions([(previous, current)])
+    return current
+
+
+def record_item_deleted(item):
+    """Take a deleted order line back out of the product rollups."""
+    apply_item_transitions([(getattr(item, '_rollup_state', None) or item_state(item), None)])
+
+
+def apply_item_transitions(transitions):
+    """
+    Apply a batch of ``(previous, current)`` order line states to the
+    product rollups, one increment per affected (date, product) row.
+    """
+    sales = defaultdict(lambda: {'units_sold': 0, 'revenue': Decimal('0'), 'orders_count': 0})
+    titles = {}
+    for previous, current in transitions:
+        if previous == current:
+            continue
+        for state, sign in ((previous, -1), (current, 1)):
+            if not state:
+                continue
+            key = (state['date'], state['product_id'])
+            sales[key]['units_sold'] += sign * state['quantity']
+            sales[key]['revenue'] += sign * state['revenue']
+            sales[key]['orders_count'] += sign
+            titles[key] = state['product_title']
+
+    for (date, product_id), deltas in sales.items():
+        _bump(
+            DailyProductSales,
+            {'date': date, 'product_id': product_id},
+            deltas,
+            defaults={'product_title': titles[(date, product_id)]},
+        )
+
+
+def _window(date_from, date_to):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(date_from, time.min), tz)
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+@transaction.atomic
+def rebuild(date_from=None, date_to=None):
+    """
+    Recompute all rollups for ``date_from``..``date_to`` (inclusive) from the
+    order tables. Defaults to the full order history.
+    Returns the number of rollup rows written per table.
+    """
+    date_to = date_to or timezone.localdate()
+    if date_from is None:
+        first = Order.objects.aggregate(first=Min('created_at'))['first']
+        date_from = _day(first) if first else date_to
+    start, end = _window(date_from, date_to)
+
+    for model in (DailyOrderStats, DailyProductSales, DailyCustomerSpend):
+        model.objects.filter(date__gte=date_from, date__lte=date_to).delete()
+
+    orders = Order.objects.filter(created_at__gte=start, created_at__lt=end).annotate(
+        date=TruncDate('created_at')
+    ).order_by()
+    items = OrderItem.objects.filter(created_at__gte=start, created_at__lt=end).annotate(
+        date=TruncDate('created_at')
+    ).order_by()
+
+    stats = DailyOrderStats.objects.bulk_create([
+        DailyOrderStats(**row) for row in orders.values(
+            'date', 'status', 'payment_method', 'is_paid'
+        ).annotate(orders_count=Count('id'), revenue=Sum('total_amount'))
+    ], batch_size=1000)
+
+    spend = DailyCustomerSpend.objects.bulk_create([
+        DailyCustomerSpend(**row) for row in orders.values('date', 'user_id').annotate(
+            orders_count=Count('id'), total_spent=Sum('total_amount')
+        )
+    ], batch_size=1000)
+
+    products = DailyProductSales.objects.bulk_create([
+        DailyProductSales(
+            date=row['date'],
+            product_id=row['product_id'],
+            product_title=row['product_title'] or '',
+            units_sold=row['units_sold'],
+            revenue=row['revenue'],
+            orders_count=row['orders_count'],
+        )
+        for row in items.values('date', 'product_id').annotate(
+            product_title=Min('product_title'),
+            units_sold=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('price')),
+            orders_count=Count('id'),
+        )
+    ], batch_size=1000)
+
+    return {
+        'order_stats': len(stats),
+        'product_sales': len(products),
+        'customer_spend': len(spend),
+    }
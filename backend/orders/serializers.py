@@ -1,8 +1,9 @@
 from rest_framework import serializers
+from django.core.files.storage import default_storage
 from .models import Order, OrderItem
-from products.api.serializers import ProductSerializer
 from users.models import User
 from django.db.models import Sum
+from django.utils.dateparse import parse_date
 
 class OrderItemSerializer(serializers.ModelSerializer):
     """
@@ -11,9 +12,9 @@ class OrderItemSerializer(serializers.ModelSerializer):
     Used for API responses and requests involving order items.
     """
     
-    # Include the full product details in the response (read-only)
-    # This uses the ProductSerializer to nest complete product information
-    product = ProductSerializer(read_only=True)
+    # Product details as they were when the order was placed (read-only)
+    # Rendered from the stored snapshot, so no join to the live product
+    product = serializers.SerializerMethodField()
     
     # Include the calculated subtotal field (read-only)
     # This will automatically call the subtotal property from the model
@@ -28,6 +29,24 @@ class OrderItemSerializer(serializers.ModelSerializer):
             'fulfilled_at', 'created_at'
         ]
 
+    def get_product(self, obj):
+        """
+        Build the nested product payload from the order-time snapshot.
+        Items saved before snapshots existed fall back to the live product.
+        """
+        snapshot = obj.product_snapshot
+        if not snapshot:
+            if obj.product is None:
+                return None
+            snapshot = OrderItem.build_product_snapshot(obj.product, sku=obj.product_sku)
+
+        data = dict(snapshot)
+        if data.get('image'):
+            url = default_storage.url(data['image'])
+            request = self.context.get('request')
+            data['image'] = request.build_absolute_uri(url) if request else url
+        return data
+
 class PlaceOrderSerializer(serializers.Serializer):
     """
     Serializer for placing new orders from cart
@@ -119,6 +138,37 @@ class UserOrderHistorySerializer(serializers.ModelSerializer):
             'items_count', 'items', 'estimated_delivery_days', 'tracking_number'
         ]
 
+class TrackingOrderItemSerializer(OrderItemSerializer):
+    """
+    Order line as shown on the public tracking page.
+    """
+    class Meta(OrderItemSerializer.Meta):
+        fields = [
+            'id', 'product', 'product_title', 'quantity', 'price',
+            'subtotal', 'is_fulfilled'
+        ]
+
+class TrackingOrderSerializer(serializers.ModelSerializer):
+    """
+    Reduced order payload for public order tracking.
+    Leaves out customer, address, contact and note fields, since the
+    endpoint is reachable with just an order number.
+    """
+    
+    items = TrackingOrderItemSerializer(many=True, read_only=True)
+    items_count = serializers.ReadOnlyField()
+    status_display = serializers.ReadOnlyField()
+    estimated_delivery_days = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Order
+        fields = [
+            'order_number', 'status', 'status_display', 'created_at', 'updated_at',
+            'confirmed_at', 'shipped_at', 'delivered_at', 'total_amount',
+            'tracking_number', 'courier_service', 'estimated_delivery_days',
+            'items_count', 'items'
+        ]
+
 class AdminOrderSerializer(serializers.ModelSerializer):
     """
     Detailed serializer for admin dashboard views.
@@ -164,4 +214,49 @@ class OrderStatusUpdateSerializer(serializers.Serializer):
     is_paid = serializers.BooleanField(required=False)
     tracking_number = serializers.CharField(max_length=100, required=False, allow_blank=True)
     courier_service = serializers.CharField(max_length=100, required=False, allow_blank=True)
-    admin_notes = serializers.CharField(max_length=1000, required=False, allow_blank=True)
\ No newline at end of file
+    admin_notes = serializers.CharField(max_length=1000, required=False, allow_blank=True)
+
+class BulkOrderStatusUpdateSerializer(serializers.Serializer):
+    """
+    Serializer for updating the status of many orders at once.
+    Orders are selected either by `order_ids` or by `filter`, which takes the
+    same keys as the admin order list (status, is_paid, payment_method,
+    date_from, date_to, search).
+    """
+    MAX_ORDERS = 1000
+
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=MAX_ORDERS
+    )
+    filter = serializers.DictField(child=serializers.CharField(), required=False)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    tracking_number = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    courier_service = serializers.CharField(max_length=100, required=False, allow_blank=True)
+
+    FILTER_KEYS = ('status', 'is_paid', 'payment_method', 'date_from', 'date_to', 'search')
+
+    def validate_filter(self, value):
+        # An empty or unknown filter would select every order
+        unknown = sorted(set(value) - set(self.FILTER_KEYS))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown filter keys: {', '.join(unknown)}")
+        if not value:
+            raise serializers.ValidationError("Filter must not be empty")
+        for key in ('date_from', 'date_to'):
+            if key not in value:
+                continue
+            try:
+                valid = parse_date(value[key]) is not None
+            except ValueError:
+                valid = False
+            if not valid:
+                raise serializers.ValidationError(f"{key} must be a date (YYYY-MM-DD)")
+        return value
+
+    def validate(self, data):
+        if ('order_ids' in data) == ('filter' in data):
+            raise serializers.ValidationError("Provide either order_ids or filter")
+        return data
@@ -0,0 +1,212 @@
+import logging
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from cart.pricing import price_totals
+from products.models import Product
+from .cache import invalidate_tracking
+from .models import Order, OrderItem, OrderStatusEvent
+from .rollups import ORDER_STATE_FIELDS, apply_item_transitions, apply_order_transitions, item_state
+
+logger = logging.getLogger(__name__)
+
+
+class OrderService:
+    """
+    Set-based order operations shared by views, payments and maintenance jobs.
+    """
+
+    @staticmethod
+    def lock_orders(queryset, limit=None):
+        """
+        SELECT ... FOR UPDATE the orders in ``queryset`` (in id order, so
+        concurrent callers lock in the same order) and load only the fields
+        the status bookkeeping needs, optionally at most ``limit`` of them.
+        """
+        queryset = (
+            queryset.select_for_update(of=('self',)).order_by('id')
+            .only('id', 'order_number', 'stock_reserved', *ORDER_STATE_FIELDS)
+        )
+        return list(queryset[:limit] if limit is not None else queryset)
+
+    @staticmethod
+    def set_status(orders, new_status, source='system', actor=None, note='', now=None, extra=None):
+        """
+        Move locked ``orders`` (from lock_orders) to ``new_status`` with one
+        UPDATE, applying the same timestamp rules as Order.change_status.
+        ``extra`` holds further field values the same UPDATE writes (e.g.
+        ``is_paid``).
+
+        QuerySet.update bypasses Order.save, so this also feeds the sales
+        rollups, appends the status events and drops cached tracking payloads.
+        Returns the orders whose status actually changed.
+        """
+        to_change = [order for order in orders if order.status != new_status]
+        if not to_change:
+            return []
+        now = now or timezone.now()
+
+        changes = {'status': new_status, 'updated_at': now, **(extra or {})}
+        timestamp_field = Order.STATUS_TIMESTAMP_FIELDS.get(new_status)
+        if timestamp_field:
+            changes[timestamp_field] = Coalesce(F(timestamp_field), Value(now))
+        Order.objects.filter(id__in=[order.id for order in to_change]).update(**changes)
+
+        apply_order_transitions([
+            (order._rollup_state, {
+                **order._rollup_state,
+                **{field: value for field, value in (extra or {}).items() if field in order._rollup_state},
+                'status': new_status,
+            })
+            for order in to_change
+        ])
+        OrderStatusEvent.objects.bulk_create([
+            OrderStatusEvent(
+                order_id=order.id,
+                from_status=order.status,
+                to_status=new_status,
+                source=source,
+                actor=actor,
+                note=note,
+                created_at=now,
+            )
+            for order in to_change
+        ])
+
+        order_numbers = [order.order_number for order in to_change]
+        transaction.on_commit(lambda: invalidate_tracking(*order_numbers))
+        return to_change
+
+    @staticmethod
+    def order_quantities(order_ids):
+        """
+        Units per product across the given orders: {product_id: quantity}.
+        Lines whose product has since been deleted are skipped, and so are
+        refunded units (the refund restocked them).
+        """
+        rows = OrderItem.objects.filter(
+            order_id__in=order_ids, product__isnull=False
+        ).values('product_id').annotate(
+            quantity=Sum(F('quantity') - F('refunded_quantity'))
+        ).order_by('product_id')
+        return {row['product_id']: row['quantity'] for row in rows}
+
+    @staticmethod
+    def create_order(user, lines, promo_code=None, discount_amount=None, reserve_stock=True, **fields):
+        """
+        Create an order for ``user`` from ``lines`` (``(product_id, quantity)``
+        pairs, repeated products are merged) priced like the cart.
+
+        The products are read, and locked, in one query and the lines are
+        inserted with one bulk INSERT. With ``reserve_stock`` the ordered
+        units are taken off the shelf and the order is flagged so cancelling
+        it puts them back. Other keyword arguments are Order fields
+        (shipping address, payment method...).
+        Raises ValueError for unknown products, bad quantities or, when
+        reserving, insufficient stock; nothing is written then.
+        """
+        quantities = defaultdict(int)
+        try:
+            for product_id, quantity in lines:
+                quantities[int(product_id)] += int(quantity)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'Invalid cart data: {e}')
+        if not quantities:
+            raise ValueError('No items to order')
+        if any(quantity < 1 for quantity in quantities.values()):
+            raise ValueError('Invalid cart data: quantities must be at least 1')
+
+        with transaction.atomic():
+            products = {
+                product.id: product
+                for product in Product.objects.select_for_update(of=('self',)).select_related('category')
+                .filter(id__in=list(quantities)).order_by('id')
+            }
+            for product_id, quantity in quantities.items():
+                product = products.get(product_id)
+                if product is None:
+                    raise ValueError(f'Product with ID {product_id} not found')
+                if reserve_stock and product.stock < quantity:
+                    raise ValueError(f'Insufficient stock for {product.title}. Available: {product.stock}, requested: {quantity}')
+
+            subtotal = sum((products[pid].unit_price * quantity for pid, quantity in quantities.items()), Decimal('0'))
+            order = Order.objects.create(
+                user=user,
+                promo_code=promo_code or '',
+                stock_reserved=reserve_stock,
+                **price_totals(subtotal, discount_amount),
+                **fields,
+            )
+
+            # bulk_create skips OrderItem.save, so report the new lines to the rollups here
+            items = OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=products[product_id],
+                    quantity=quantity,
+                    price=products[product_id].unit_price,
+                    product_title=products[product_id].title,
+                    product_snapshot=OrderItem.build_product_snapshot(products[product_id]),
+                )
+                for product_id, quantity in quantities.items()
+            ])
+            states = [item_state(item) for item in items]
+            apply_item_transitions([(None, state) for state in states])
+            for item, state in zip(items, states):
+                item._rollup_state = state
+
+            if reserve_stock:
+                OrderService.take_stock(quantities)
+
+        logger.info(f"Created order {order.id} with {len(items)} items for user {user.id}")
+        return order
+
+    @staticmethod
+    def take_stock(quantities):
+        """
+        Take ordered units off the shelf: one ``stock = stock - n`` UPDATE
+        per product, in product id order. The counterpart of restore_stock.
+        """
+        for product_id in sorted(quantities):
+            if quantities[product_id] > 0:
+                Product.objects.filter(id=product_id).update(stock=F('stock') - quantities[product_id])
+
+    @staticmethod
+    def restore_stock(quantities):
+        """
+        Put units back on the shelf: one ``stock = stock + n`` UPDATE per
+        product, in product id order to avoid lock-order deadlocks.
+        ``quantities`` maps product_id -> units to restore.
+        """
+        for product_id in sorted(quantities):
+            if quantities[product_id] > 0:
+                Product.objects.filter(id=product_id).update(stock=F('stock') + quantities[product_id])
+
+    @staticmethod
+    def cancel_orders(order_ids, source='system', actor=None, note='',
+                      from_statuses=Order.CANCELLABLE_STATUSES, restock=True):
+        """
+        Cancel every order in ``order_ids`` that is still in one of
+        ``from_statuses`` and release the stock it reserved, all in one
+        transaction.
+        Orders in any other status are left untouched, so concurrent
+        cancellations, payments and reapers cannot restock twice.
+        Returns the cancelled orders.
+        """
+        with transaction.atomic():
+            orders = OrderService.lock_orders(
+                Order.objects.filter(id__in=order_ids, status__in=from_statuses)
+            )
+            if not orders:
+                return []
+
+            cancelled = OrderService.set_status(orders, 'cancelled', source=source, actor=actor, note=note)
+            reserved = [order.id for order in cancelled if order.stock_reserved]
+            if restock and reserved:
+                OrderService.restore_stock(OrderService.order_quantities(reserved))
+
+        logger.info(f"Cancelled {len(cancelled)} orders ({source})")
+        return cancelled
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from users.models import User
+from .models import Order, OrderItem
+from .rollups import record_item_deleted, record_order_deleted
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    """Take a deleted order out of the daily rollups (covers QuerySet.delete too)"""
+    record_order_deleted(instance)
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_item_from_rollups(sender, instance, **kwargs):
+    """Take a deleted order line out of the daily product rollups"""
+    record_item_deleted(instance)
+
+
+@receiver(post_save, sender=User)
+def refresh_order_search_text(sender, instance, created, **kwargs):
+    """Copy a customer's new email/name into their orders' search column (in the background)"""
+    update_fields = kwargs.get('update_fields')
+    if created or (update_fields and not set(User.ORDER_SEARCH_FIELDS) & set(update_fields)):
+        return
+    # Profile, verification and password saves rewrite every field; skip
+    # them unless the email or name actually changed
+    previous = getattr(instance, '_order_search_state', None)
+    current = instance.order_search_state()
+    instance._order_search_state = current
+    if previous == current:
+        return
+    # A customer can have hundreds of orders; don't rewrite them in the request
+    from .tasks import refresh_order_search_text
+    refresh_order_search_text.enqueue(instance.id)
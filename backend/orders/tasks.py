@@ -0,0 +1,19 @@
+from jobs.queue import task
+from users.models import User
+from .models import Order
+
+
+@task(queue='default', max_attempts=3)
+def refresh_order_search_text(user_id):
+    """Copy a customer's current email/name into the search column of their orders"""
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return
+    changed = []
+    for order in user.orders.only('id', 'order_number', 'shipping_address', 'search_text'):
+        search_text = order.build_search_text(user)
+        if search_text != order.search_text:
+            order.search_text = search_text
+            changed.append(order)
+    if changed:
+        Order.objects.bulk_update(changed, ['search_text'], batch_size=500)
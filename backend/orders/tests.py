@@ -1,3 +1,41 @@
-from django.test import TestCase
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from django.test import SimpleTestCase
+from .identifiers import LENGTH, new_id
 
-# Create your tests here.
+
+def _generate(count):
+    return [new_id() for _ in range(count)]
+
+
+class NewIdTests(SimpleTestCase):
+    """orders.identifiers.new_id: unique and time-ordered under concurrency"""
+
+    THREADS = 8
+    PROCESSES = 4
+    PER_WORKER = 20000
+
+    def test_format(self):
+        value = new_id()
+        self.assertEqual(len(value), LENGTH)
+        self.assertRegex(value, r'^[0-9A-HJKMNP-TV-Z]+$')
+
+    def test_increasing_within_a_process(self):
+        ids = _generate(self.PER_WORKER)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_unique_across_threads_and_processes(self):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            thread_batches = list(pool.map(_generate, [self.PER_WORKER] * self.THREADS))
+        # Forked after the parent generated ids: without the at-fork reset
+        # in identifiers.py every child would count on from the same state
+        # and the processes would repeat each other's ids
+        with multiprocessing.get_context('fork').Pool(self.PROCESSES) as pool:
+            process_batches = pool.map(_generate, [self.PER_WORKER] * self.PROCESSES)
+
+        batches = thread_batches + process_batches
+        total = sum(len(batch) for batch in batches)
+        self.assertEqual(len(set().union(*batches)), total, "new_id() repeated itself")
+        for batch in batches:
+            self.assertEqual(batch, sorted(batch), "a worker got out-of-order ids")
@@ -8,7 +8,9 @@ from .views import (
     AdminOrderDetailView,
     admin_dashboard_stats,
     update_order_status,
-    order_tracking
+    order_tracking,
+    export_orders,
+    bulk_update_order_status
 )
 
 """
@@ -55,6 +57,14 @@ urlpatterns = [
     # Supports search, status filters, payment method filters, date ranges
     path('admin/orders/', AdminOrderListView.as_view(), name='admin-order-list'),
     
+    # GET /api/admin/orders/export/ - Stream orders as CSV or JSON Lines
+    # Same filters as the list; ?type=csv|jsonl&rows=orders|lines
+    path('admin/orders/export/', export_orders, name='admin-order-export'),
+    
+    # PATCH /api/admin/orders/bulk-status/ - Move many orders to a new status
+    # Takes order_ids or a filter, plus optional tracking info; per-order results
+    path('admin/orders/bulk-status/', bulk_update_order_status, name='bulk-update-order-status'),
+    
     # GET /api/admin/orders/{id}/ - View any order details
     # PUT /api/admin/orders/{id}/ - Update order information
     # Enhanced with comprehensive order management
@@ -1,5 +1,9 @@
 from django.shortcuts import render
-from django.db.models import Sum, Count, Q, F
+from django.http import Http404, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import http_date, parse_http_date_safe
+from django.db import transaction
+from django.db.models import Sum, Count, Q, F, Max, ExpressionWrapper, DurationField
 from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -8,11 +12,18 @@ from rest_framework import status, generics
 from rest_framework.decorators import api_view, permission_classes
 from datetime import datetime, timedelta
 from decimal import Decimal
+from django.conf import settings
+import csv
+import itertools
+import json
 import logging
+import re
 
-logger = logging.getLogger(__name__)
-from .models import Order, OrderItem
-from products.models import Product
+from .models import Order, OrderItem, OrderStatusEvent, ArchivedOrder, DailyOrderStats, DailyProductSales, DailyCustomerSpend
+from .archive import load_order as load_archived_order
+from .cache import get_or_compute, tracking_cache_key, invalidate_tracking
+from .expressions import EpochSeconds, Percentile
+from .services import OrderService
 from cart.models import Cart, CartItem
 from users.models import User
 from .serializers import (
@@ -20,9 +31,20 @@ from .serializers import (
     UserOrderHistorySerializer, 
     AdminOrderSerializer,
     PlaceOrderSerializer,
-    OrderStatusUpdateSerializer
+    OrderStatusUpdateSerializer,
+    BulkOrderStatusUpdateSerializer,
+    TrackingOrderSerializer
 )
 
+logger = logging.getLogger(__name__)
+
+# Statuses whose time-since-placement is reported on the dashboard
+LATENCY_MILESTONES = ['confirmed', 'shipped', 'delivered']
+
+# Full order numbers as generated by Order.save (ORD- plus a 20 character
+# time-ordered id), or the older ORD- plus 8 hex digits
+ORDER_NUMBER_PATTERN = re.compile(r'^ORD-(?:[0-9A-HJKMNP-TV-Z]{20}|[0-9A-F]{8})$', re.IGNORECASE)
+
 class PlaceOrderView(APIView):
     """
     Enhanced API View for creating new orders from cart.
@@ -72,7 +94,7 @@ class PlaceOrderView(APIView):
                 # Check if the existing order has the same items as the cart
                 existing_items = existing_pending_order.items.all()
                 cart_product_ids = [item['product_id'] for item in cart_items]
-                existing_product_ids = [item.product.id for item in existing_items]
+                existing_product_ids = [item.product_id for item in existing_items]
                 
                 logger.info(f"User {user.id} attempting to place order with products {cart_product_ids}, existing order has {existing_product_ids}")
                 
@@ -109,86 +131,24 @@ class PlaceOrderView(APIView):
             except Cart.DoesNotExist:
                 pass
 
-            # Create the main order object
-            order_data = {
-                'user': user_locked,
-                'shipping_address': validated_data['shipping_address'],
-                'shipping_city': validated_data.get('shipping_city', ''),
-                'shipping_state': validated_data.get('shipping_state', ''),
-                'shipping_zip': validated_data.get('shipping_zip', ''),
-                'shipping_country': validated_data.get('shipping_country', 'USA'),
-                'shipping_phone': validated_data.get('shipping_phone', ''),
-                'payment_method': validated_data.get('payment_method', 'cash_on_delivery'),
-                'customer_notes': validated_data.get('customer_notes', ''),
-            }
-            
-            # Apply promo code if exists
-            if user_cart and user_cart.promo_code:
-                order_data['promo_code'] = user_cart.promo_code
-                order_data['discount_amount'] = user_cart.discount_amount
-
-            # Create the order (still within the atomic transaction)
+            # Create the order, its items and the stock reservation in one go,
+            # priced like the cart (including any promo code applied to it)
             try:
-                # Create the order
-                order = Order.objects.create(**order_data)
-                
-                # Calculate totals
-                subtotal = Decimal('0')
-                items_created = []
-                
-                # Process each item in the cart
-                for item in cart_items:
-                    try:
-                        product = Product.objects.select_for_update().get(id=item['product_id'])
-                        quantity = int(item['quantity'])
-                        price = product.unit_price
-                        
-                        # Check if enough stock is available
-                        if product.stock < quantity:
-                            raise ValueError(f'Insufficient stock for {product.title}. Available: {product.stock}, requested: {quantity}')
-                        
-                        # Create order item with current product price
-                        order_item = OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            quantity=quantity,
-                            price=price,
-                            product_title=product.title,
-                            product_sku=getattr(product, 'sku', ''),
-                        )
-                        
-                        items_created.append(order_item)
-                        
-                        # Update product stock (reduce by ordered quantity)
-                        product.stock -= quantity
-                        product.save()
-                        
-                        # Add to subtotal
-                        subtotal += price * quantity
-                        
-                    except Product.DoesNotExist:
-                        raise ValueError(f'Product with ID {item["product_id"]} not found')
-                    except (ValueError, KeyError) as e:
-                        raise ValueError(f'Invalid cart data: {str(e)}')
-
-                # Calculate order totals
-                order.subtotal = subtotal
-                
-                # Calculate shipping cost (free shipping over $100)
-                if subtotal >= 100:
-                    order.shipping_cost = Decimal('0.00')
-                else:
-                    order.shipping_cost = Decimal('10.00')
-                
-                # Calculate tax (10%)
-                order.tax_amount = (subtotal * Decimal('0.10')).quantize(Decimal('0.01'))
-                
-                # Apply discount if any
-                discount = order.discount_amount or Decimal('0')
-                
-                # Calculate final total
-                order.total_amount = subtotal + order.shipping_cost + order.tax_amount - discount
-                order.save()
+                order = OrderService.create_order(
+                    user_locked,
+                    [(item.get('product_id'), item.get('quantity')) for item in cart_items],
+                    promo_code=user_cart.promo_code if user_cart else None,
+                    discount_amount=user_cart.discount_amount if user_cart else None,
+                    reserve_stock=True,
+                    shipping_address=validated_data['shipping_address'],
+                    shipping_city=validated_data.get('shipping_city', ''),
+                    shipping_state=validated_data.get('shipping_state', ''),
+                    shipping_zip=validated_data.get('shipping_zip', ''),
+                    shipping_country=validated_data.get('shipping_country', 'USA'),
+                    shipping_phone=validated_data.get('shipping_phone', ''),
+                    payment_method=validated_data.get('payment_method', 'cash_on_delivery'),
+                    customer_notes=validated_data.get('customer_notes', ''),
+                )
 
                 # Clear user's cart after successful order
                 if user_cart:
@@ -234,7 +194,7 @@ class UserOrderHistoryView(generics.ListAPIView):
         """
         Filter orders with enhanced filtering capabilities
         """
-        queryset = Order.objects.filter(user=self.request.user).prefetch_related('items__product')
+        queryset = Order.objects.filter(user=self.request.user).prefetch_related('items')
         
         # Filter by status if provided
         status_filter = self.request.query_params.get('status')
@@ -261,6 +221,7 @@ class UserOrderDetailView(generics.RetrieveAPIView):
     - Requires user authentication
     - Returns detailed information about a specific order
     - Users can only access their own orders (security)
+    - Orders from archived months are read back from cold storage
     """
     
     serializer_class = OrderSerializer
@@ -270,7 +231,16 @@ class UserOrderDetailView(generics.RetrieveAPIView):
         """
         Filter to only orders belonging to the authenticated user.
         """
-        return Order.objects.filter(user=self.request.user).prefetch_related('items__product')
+        return Order.objects.filter(user=self.request.user).prefetch_related('items')
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            archived = ArchivedOrder.objects.filter(order_id=kwargs['pk'], user=request.user).first()
+            if archived is None:
+                raise
+            return Response(load_archived_order(archived)['order'])
 
 
 class CancelOrderView(APIView):
@@ -290,15 +260,14 @@ class CancelOrderView(APIView):
                 'detail': f'Order cannot be cancelled. Current status: {order.status_display}'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Restore product stock
-        for item in order.items.all():
-            product = item.product
-            product.stock += item.quantity
-            product.save()
-        
-        # Update order status
-        order.status = 'cancelled'
-        order.save()
+        # Flip the status (only if still cancellable) and restore product
+        # stock with one set-based update per product, in one transaction
+        cancelled = OrderService.cancel_orders([order.id], source='customer', actor=request.user)
+        order.refresh_from_db()
+        if not cancelled:
+            return Response({
+                'detail': f'Order cannot be cancelled. Current status: {order.status_display}'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'message': 'Order cancelled successfully',
@@ -308,6 +277,50 @@ class CancelOrderView(APIView):
 
 # Admin Dashboard APIs - Enhanced with better functionality
 
+def filter_admin_orders(queryset, params):
+    """
+    Apply the admin order filters (status, is_paid, payment_method,
+    date_from/date_to, search) from query params to an Order queryset.
+    Shared by the admin list and the export endpoint.
+    """
+    
+    # Filter by order status
+    status_filter = params.get('status')
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    
+    # Filter by payment status
+    is_paid = params.get('is_paid')
+    if is_paid is not None:
+        queryset = queryset.filter(is_paid=is_paid.lower() == 'true')
+    
+    # Filter by payment method
+    payment_method = params.get('payment_method')
+    if payment_method:
+        queryset = queryset.filter(payment_method=payment_method)
+    
+    # Filter by date range
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+    
+    if date_from:
+        queryset = queryset.filter(created_at__date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(created_at__date__lte=date_to)
+    
+    # Search functionality
+    search = (params.get('search') or '').strip()
+    if search:
+        if ORDER_NUMBER_PATTERN.match(search):
+            # Exact order number - direct unique index lookup
+            queryset = queryset.filter(order_number=search.upper())
+        else:
+            # Substring match on the trigram-indexed search column
+            queryset = queryset.filter(search_text__contains=search.lower())
+    
+    return queryset
+
+
 class AdminOrderListView(generics.ListAPIView):
     """
     Enhanced Admin API to view all orders with comprehensive filtering.
@@ -321,49 +334,13 @@ class AdminOrderListView(generics.ListAPIView):
     
     serializer_class = AdminOrderSerializer
     permission_classes = [IsAdminUser]
-    queryset = Order.objects.all().prefetch_related('items__product').select_related('user')
+    queryset = Order.objects.all().prefetch_related('items').select_related('user')
 
     def get_queryset(self):
         """
         Enhanced filtering with search functionality
         """
-        queryset = super().get_queryset()
-        
-        # Filter by order status
-        status_filter = self.request.query_params.get('status')
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        
-        # Filter by payment status
-        is_paid = self.request.query_params.get('is_paid')
-        if is_paid is not None:
-            queryset = queryset.filter(is_paid=is_paid.lower() == 'true')
-        
-        # Filter by payment method
-        payment_method = self.request.query_params.get('payment_method')
-        if payment_method:
-            queryset = queryset.filter(payment_method=payment_method)
-        
-        # Filter by date range
-        date_from = self.request.query_params.get('date_from')
-        date_to = self.request.query_params.get('date_to')
-        
-        if date_from:
-            queryset = queryset.filter(created_at__date__gte=date_from)
-        if date_to:
-            queryset = queryset.filter(created_at__date__lte=date_to)
-        
-        # Search functionality
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(order_number__icontains=search) |
-                Q(user__username__icontains=search) |
-                Q(user__email__icontains=search) |
-                Q(shipping_address__icontains=search)
-            )
-        
-        return queryset
+        return filter_admin_orders(super().get_queryset(), self.request.query_params)
 
 
 class AdminOrderDetailView(generics.RetrieveUpdateAPIView):
@@ -376,7 +353,77 @@ class AdminOrderDetailView(generics.RetrieveUpdateAPIView):
     
     serializer_class = AdminOrderSerializer
     permission_classes = [IsAdminUser]
-    queryset = Order.objects.all().prefetch_related('items__product').select_related('user')
+    queryset = Order.objects.all().prefetch_related('items').select_related('user')
+
+
+class _Echo:
+    """File-like object whose write() just returns the value, for csv.writer streaming"""
+    def write(self, value):
+        return value
+
+
+EXPORT_ORDER_FIELDS = [
+    'order_number', 'created_at', 'status', 'is_paid', 'payment_method', 'payment_date',
+    'user__email', 'shipping_address', 'shipping_city', 'shipping_state', 'shipping_zip',
+    'shipping_country', 'subtotal', 'shipping_cost', 'tax_amount', 'discount_amount',
+    'total_amount', 'promo_code', 'tracking_number', 'courier_service',
+]
+EXPORT_LINE_FIELDS = [
+    'order__order_number', 'order__created_at', 'order__status', 'order__is_paid',
+    'order__payment_method', 'order__user__email', 'product_id', 'product_title',
+    'product_sku', 'quantity', 'price', 'is_fulfilled', 'fulfilled_at',
+]
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_orders(request):
+    """
+    Stream orders for finance as CSV or JSON Lines.
+    
+    GET /api/admin/orders/export/?type=csv&rows=orders
+    - Accepts the same filters as the admin order list
+    - type: csv (default) or jsonl
+    - rows: orders (one row per order, default) or lines (one row per order item)
+    - Reads plain values() rows through a server-side cursor, so memory
+      stays flat regardless of the number of rows
+    """
+    export_type = request.query_params.get('type', 'csv')
+    rows = request.query_params.get('rows', 'orders')
+    if export_type not in ('csv', 'jsonl') or rows not in ('orders', 'lines'):
+        return Response({
+            'detail': 'type must be csv or jsonl and rows must be orders or lines'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    orders = filter_admin_orders(Order.objects.all(), request.query_params)
+    if rows == 'orders':
+        fields = EXPORT_ORDER_FIELDS
+        queryset = orders.order_by('id').values_list(*fields)
+    else:
+        fields = EXPORT_LINE_FIELDS
+        queryset = OrderItem.objects.filter(
+            order__in=orders.order_by().values('id')
+        ).order_by('order_id', 'id').values_list(*fields)
+    
+    records = queryset.iterator(chunk_size=settings.ORDER_EXPORT_CHUNK_SIZE)
+    if export_type == 'csv':
+        writer = csv.writer(_Echo())
+        content = itertools.chain(
+            [writer.writerow(fields)],
+            (writer.writerow(record) for record in records),
+        )
+        content_type = 'text/csv'
+    else:
+        content = (
+            json.dumps(dict(zip(fields, record)), cls=DjangoJSONEncoder) + '\n'
+            for record in records
+        )
+        content_type = 'application/x-ndjson'
+    
+    filename = f"orders-{rows}-{timezone.now():%Y%m%d-%H%M%S}.{export_type}"
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 @api_view(['GET'])
@@ -388,90 +435,156 @@ def admin_dashboard_stats(request):
     GET /api/admin/dashboard/stats/?days=30
     - Returns enhanced analytics and metrics
     - Supports different time periods
+    - Reads the daily rollup tables (orders/rollups.py), so the cost does
+      not grow with the length of the period
+    - The whole response is cached per `days` value for
+      DASHBOARD_STATS_CACHE_TTL seconds with single-flight recomputation
     """
     
     # Get date range from query params (default to last 30 days)
-    days = int(request.query_params.get('days', 30))
-    date_from = timezone.now() - timedelta(days=days)
-    
-    # Base queryset for the specified time period
-    orders_queryset = Order.objects.filter(created_at__gte=date_from)
-    
-    # Enhanced statistics
-    total_orders = orders_queryset.count()
-    total_sales = orders_queryset.aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-    paid_orders = orders_queryset.filter(is_paid=True).count()
-    pending_orders = orders_queryset.filter(status='pending').count()
-    cancelled_orders = orders_queryset.filter(status='cancelled').count()
-    delivered_orders = orders_queryset.filter(status='delivered').count()
+    try:
+        days = int(request.query_params.get('days', 30))
+    except ValueError:
+        return Response({'detail': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = get_or_compute(
+        f"orders:dashboard-stats:{days}",
+        lambda: _compute_dashboard_stats(days),
+        timeout=settings.DASHBOARD_STATS_CACHE_TTL,
+    )
+    return Response(data)
+
+
+def _compute_dashboard_stats(days):
+    """Build the dashboard payload for the last `days` days"""
+    date_from = timezone.localdate() - timedelta(days=days)
+    
+    # Base rollup querysets for the specified time period
+    stats_queryset = DailyOrderStats.objects.filter(date__gte=date_from)
+    
+    # Overview, status breakdown and payment breakdown in a single pass:
+    # one filtered SUM per status and per payment method
+    aggregates = {
+        'total_orders': Sum('orders_count'),
+        'total_sales': Sum('revenue'),
+        'paid_orders': Sum('orders_count', filter=Q(is_paid=True)),
+    }
+    for value, _ in Order.STATUS_CHOICES:
+        aggregates[f'status_{value}_count'] = Sum('orders_count', filter=Q(status=value))
+        aggregates[f'status_{value}_sales'] = Sum('revenue', filter=Q(status=value))
+    for value, _ in Order.PAYMENT_METHOD_CHOICES:
+        aggregates[f'payment_{value}_count'] = Sum('orders_count', filter=Q(payment_method=value))
+        aggregates[f'payment_{value}_sales'] = Sum('revenue', filter=Q(payment_method=value))
+    totals = stats_queryset.aggregate(**aggregates)
+    
+    total_orders = totals['total_orders'] or 0
+    total_sales = totals['total_sales'] or Decimal('0')
     
     # Average order value
-    avg_order_value = orders_queryset.aggregate(avg=Sum('total_amount')/Count('id'))['avg'] or Decimal('0')
+    avg_order_value = total_sales / total_orders if total_orders else Decimal('0')
     
     # Orders by status with counts
-    orders_by_status = orders_queryset.values('status').annotate(
-        count=Count('id'),
-        total_sales=Sum('total_amount')
-    ).order_by('status')
+    orders_by_status = sorted([
+        {
+            'status': value,
+            'count': totals[f'status_{value}_count'],
+            'total_sales': totals[f'status_{value}_sales'],
+        }
+        for value, _ in Order.STATUS_CHOICES
+        if (totals[f'status_{value}_count'] or 0) > 0
+    ], key=lambda row: row['status'])
     
     # Orders by payment method
-    orders_by_payment = orders_queryset.values('payment_method').annotate(
-        count=Count('id'),
-        total_sales=Sum('total_amount')
-    ).order_by('-count')
-    
-    # Recent orders
-    recent_orders = orders_queryset.order_by('-created_at')[:10]
-    recent_orders_data = AdminOrderSerializer(recent_orders, many=True).data
+    orders_by_payment = sorted([
+        {
+            'payment_method': value,
+            'count': totals[f'payment_{value}_count'],
+            'total_sales': totals[f'payment_{value}_sales'],
+        }
+        for value, _ in Order.PAYMENT_METHOD_CHOICES
+        if (totals[f'payment_{value}_count'] or 0) > 0
+    ], key=lambda row: -row['count'])
+    
+    # Recent orders (LIMIT 10 on the created_at ordering, independent of period length)
+    recent_orders = Order.objects.filter(
+        created_at__gte=timezone.now() - timedelta(days=days)
+    ).select_related('user').prefetch_related('items').order_by('-created_at')[:10]
+    recent_orders_data = list(AdminOrderSerializer(recent_orders, many=True).data)
     
     # Daily sales trend
-    daily_sales = orders_queryset.extra(
-        select={'date': 'DATE(created_at)'}
-    ).values('date').annotate(
-        orders_count=Count('id'),
-        sales_amount=Sum('total_amount'),
-        avg_order_value=Sum('total_amount')/Count('id')
-    ).order_by('date')
+    daily_sales = [
+        {
+            **row,
+            'avg_order_value': row['sales_amount'] / row['orders_count'] if row['orders_count'] else Decimal('0'),
+        }
+        for row in stats_queryset.values('date').annotate(
+            orders_count=Sum('orders_count'),
+            sales_amount=Sum('revenue'),
+        ).filter(orders_count__gt=0).order_by('date')
+    ]
     
     # Top selling products
-    top_products = OrderItem.objects.filter(
-        order__created_at__gte=date_from
-    ).values(
-        'product__id', 'product__title'
-    ).annotate(
-        total_quantity=Sum('quantity'),
-        total_revenue=Sum(F('quantity') * F('price')),
-        orders_count=Count('order', distinct=True)
-    ).order_by('-total_quantity')[:10]
+    top_products = [
+        {
+            'product__id': row.pop('product_id'),
+            'product__title': row.pop('title'),
+            **row,
+        }
+        for row in DailyProductSales.objects.filter(
+            date__gte=date_from
+        ).values('product_id').annotate(
+            title=Max('product_title'),
+            total_quantity=Sum('units_sold'),
+            total_revenue=Sum('revenue'),
+            orders_count=Sum('orders_count')
+        ).order_by('-total_quantity')[:10]
+    ]
     
     # Customer analytics
-    top_customers = Order.objects.filter(
-        created_at__gte=date_from
+    top_customers = DailyCustomerSpend.objects.filter(
+        date__gte=date_from
     ).values(
         'user__id', 'user__username', 'user__email'
     ).annotate(
-        total_orders=Count('id'),
-        total_spent=Sum('total_amount')
+        total_orders=Sum('orders_count'),
+        total_spent=Sum('total_spent')
     ).order_by('-total_spent')[:10]
     
-    return Response({
+    # Fulfillment latency: hours from order placement to each milestone,
+    # read from the status event log for transitions inside the period
+    hours_since_placed = EpochSeconds(ExpressionWrapper(
+        F('created_at') - F('order__created_at'), output_field=DurationField()
+    )) / 3600
+    latency_rows = OrderStatusEvent.objects.filter(
+        created_at__gte=timezone.now() - timedelta(days=days),
+        to_status__in=LATENCY_MILESTONES,
+    ).values('to_status').annotate(
+        count=Count('id'),
+        p50=Percentile(hours_since_placed, 0.5),
+        p90=Percentile(hours_since_placed, 0.9),
+        p99=Percentile(hours_since_placed, 0.99),
+    ).order_by()
+    fulfillment_latency = {row.pop('to_status'): row for row in latency_rows}
+    
+    return {
         'period_days': days,
         'overview': {
             'total_orders': total_orders,
             'total_sales': float(total_sales),
             'avg_order_value': float(avg_order_value),
-            'paid_orders': paid_orders,
-            'pending_orders': pending_orders,
-            'cancelled_orders': cancelled_orders,
-            'delivered_orders': delivered_orders,
+            'paid_orders': totals['paid_orders'] or 0,
+            'pending_orders': totals['status_pending_count'] or 0,
+            'cancelled_orders': totals['status_cancelled_count'] or 0,
+            'delivered_orders': totals['status_delivered_count'] or 0,
         },
-        'orders_by_status': list(orders_by_status),
-        'orders_by_payment': list(orders_by_payment),
+        'orders_by_status': orders_by_status,
+        'orders_by_payment': orders_by_payment,
         'recent_orders': recent_orders_data,
-        'daily_sales': list(daily_sales),
-        'top_products': list(top_products),
+        'daily_sales': daily_sales,
+        'top_products': top_products,
         'top_customers': list(top_customers),
-    })
+        'fulfillment_latency_hours': fulfillment_latency,
+    }
 
 
 @api_view(['PATCH'])
@@ -497,17 +610,8 @@ def update_order_status(request, order_id):
     admin_notes = validated_data.get('admin_notes')
     
     # Update status and set appropriate timestamps
-    if new_status and new_status != order.status:
-        order.status = new_status
-        
-        # Set appropriate timestamps based on status
-        now = timezone.now()
-        if new_status == 'confirmed' and not order.confirmed_at:
-            order.confirmed_at = now
-        elif new_status == 'shipped' and not order.shipped_at:
-            order.shipped_at = now
-        elif new_status == 'delivered' and not order.delivered_at:
-            order.delivered_at = now
+    if new_status:
+        order.change_status(new_status, source='admin', actor=request.user)
     
     # Update payment status
     if is_paid is not None:
@@ -531,65 +635,195 @@ def update_order_status(request, order_id):
     })
 
 
+@api_view(['PATCH'])
+@permission_classes([IsAdminUser])
+def bulk_update_order_status(request):
+    """
+    Update the status (and tracking info) of many orders in one request.
+    
+    PATCH /api/admin/orders/bulk-status/
+    {"order_ids": [1, 2, 3], "status": "shipped", "tracking_number": "...", "courier_service": "..."}
+    or {"filter": {"status": "packed", "date_from": "2025-01-01"}, "status": "shipped"}
+    
+    - Same timestamp rules as update_order_status
+    - Applied with set-based UPDATEs in a single transaction
+    - Returns a result per order: updated, unchanged or not_found
+    """
+    serializer = BulkOrderStatusUpdateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    validated_data = serializer.validated_data
+    new_status = validated_data['status']
+    tracking_fields = {
+        field: validated_data[field]
+        for field in ('tracking_number', 'courier_service')
+        if field in validated_data
+    }
+    
+    if 'order_ids' in validated_data:
+        requested_ids = list(dict.fromkeys(validated_data['order_ids']))
+        queryset = Order.objects.filter(id__in=requested_ids)
+    else:
+        requested_ids = None
+        queryset = filter_admin_orders(Order.objects.all(), validated_data['filter'])
+    
+    with transaction.atomic():
+        # Lock the selected rows and load only what the bookkeeping needs
+        orders = OrderService.lock_orders(queryset, limit=serializer.MAX_ORDERS + 1)
+        if len(orders) > serializer.MAX_ORDERS:
+            return Response({
+                'detail': f'Filter matches more than {serializer.MAX_ORDERS} orders. Narrow it down.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        now = timezone.now()
+        to_change = OrderService.set_status(
+            orders, new_status, source='admin', actor=request.user,
+            note='Bulk status update', now=now
+        )
+        
+        if tracking_fields and orders:
+            Order.objects.filter(id__in=[order.id for order in orders]).update(
+                updated_at=now, **tracking_fields
+            )
+            order_numbers = [order.order_number for order in orders]
+            transaction.on_commit(lambda: invalidate_tracking(*order_numbers))
+    
+    changed_ids = {order.id for order in to_change}
+    results = [
+        {
+            'id': order.id,
+            'order_number': order.order_number,
+            'result': 'updated' if order.id in changed_ids or tracking_fields else 'unchanged',
+            'previous_status': order.status,
+            'status': new_status,
+        }
+        for order in orders
+    ]
+    if requested_ids is not None:
+        found_ids = {order.id for order in orders}
+        results += [
+            {'id': order_id, 'result': 'not_found'}
+            for order_id in requested_ids if order_id not in found_ids
+        ]
+    
+    return Response({
+        'message': f'{len(changed_ids)} orders moved to {new_status}',
+        'updated_count': len(changed_ids),
+        'results': results,
+    })
+
+
+# Title and description shown on the tracking timeline for each status
+TIMELINE_STEPS = {
+    'pending': ('Order Placed', 'Your order has been placed successfully'),
+    'confirmed': ('Order Confirmed', 'Your order has been confirmed and is being prepared'),
+    'processing': ('Processing', 'Your order is being prepared'),
+    'packed': ('Packed', 'Your order has been packed'),
+    'shipped': ('Order Shipped', 'Your order has been shipped'),
+    'out_for_delivery': ('Out for Delivery', 'Your order is out for delivery'),
+    'delivered': ('Order Delivered', 'Your order has been delivered successfully'),
+    'cancelled': ('Order Cancelled', 'Your order has been cancelled'),
+    'returned': ('Order Returned', 'Your order has been returned'),
+}
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def order_tracking(request, order_number):
     """
     Public order tracking by order number
+    
+    - The rendered payload is cached per order number and invalidated when
+      the order is saved (see Order.save / tracking_cache_key)
+    - Answers conditional GETs (If-None-Match / If-Modified-Since) with 304,
+      using an ETag and Last-Modified derived from the order's updated_at
     """
-    try:
-        # For authenticated users, limit to their orders (unless staff)
-        if request.user.is_authenticated:
-            order = Order.objects.get(
-                Q(order_number=order_number) & 
-                (Q(user=request.user) if not request.user.is_staff else Q())
-            )
-        else:
-            # For public access, allow tracking by order number
-            order = Order.objects.get(order_number=order_number)
-    except Order.DoesNotExist:
+    entry = get_or_compute(
+        tracking_cache_key(order_number),
+        lambda: _build_tracking_entry(order_number),
+        timeout=settings.ORDER_TRACKING_CACHE_TTL,
+    )
+    
+    # For authenticated users, limit to their orders (unless staff)
+    if not entry['found'] or (
+        request.user.is_authenticated and not request.user.is_staff
+        and entry['user_id'] != request.user.id
+    ):
         return Response({'detail': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    # Create tracking timeline
+    headers = {
+        'ETag': entry['etag'],
+        'Last-Modified': http_date(entry['last_modified']),
+        'Cache-Control': 'private, no-cache',
+    }
+    
+    if_none_match = request.headers.get('If-None-Match')
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+    if if_none_match:
+        not_modified = entry['etag'] in [tag.strip() for tag in if_none_match.split(',')]
+    else:
+        not_modified = if_modified_since is not None and int(entry['last_modified']) <= if_modified_since
+    if not_modified:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return Response(entry['payload'], headers=headers)
+
+
+def _build_tracking_entry(order_number):
+    """Load an order and render its public tracking payload for the cache"""
+    try:
+        order = Order.objects.prefetch_related('items', 'status_events').get(order_number=order_number)
+    except Order.DoesNotExist:
+        return {'found': False}
+    
+    return {
+        'found': True,
+        'user_id': order.user_id,
+        'etag': f'"{order.order_number}-{int(order.updated_at.timestamp() * 1000000)}"',
+        'last_modified': order.updated_at.timestamp(),
+        'payload': {
+            'order': TrackingOrderSerializer(order).data,
+            'timeline': _tracking_timeline(order),
+        },
+    }
+
+
+def _tracking_timeline(order):
+    """
+    Build the tracking timeline: one step per status the order reached.
+
+    The timestamp columns give the steps of every order, including those
+    placed before the status event log existed; logged events add the
+    statuses without a column and override the column's date. Each status
+    appears once, at its first event.
+    """
+    reached = {'pending': order.created_at}
+    for status_name, field in Order.STATUS_TIMESTAMP_FIELDS.items():
+        if getattr(order, field):
+            reached[status_name] = getattr(order, field)
+    
+    logged = set()
+    for event in order.status_events.all():
+        if event.to_status not in logged:
+            logged.add(event.to_status)
+            reached[event.to_status] = event.created_at
+    
+    status_names = dict(Order.STATUS_CHOICES)
     timeline = []
-    
-    if order.created_at:
-        timeline.append({
-            'status': 'pending',
-            'title': 'Order Placed',
-            'description': 'Your order has been placed successfully',
-            'date': order.created_at,
-            'completed': True
-        })
-    
-    if order.confirmed_at:
-        timeline.append({
-            'status': 'confirmed',
-            'title': 'Order Confirmed',
-            'description': 'Your order has been confirmed and is being prepared',
-            'date': order.confirmed_at,
-            'completed': True
-        })
-    
-    if order.shipped_at:
-        timeline.append({
-            'status': 'shipped',
-            'title': 'Order Shipped',
-            'description': f'Your order has been shipped{" via " + order.courier_service if order.courier_service else ""}',
-            'date': order.shipped_at,
-            'completed': True
-        })
-    
-    if order.delivered_at:
+    for to_status, date in sorted(reached.items(), key=lambda step: step[1]):
+        title, description = TIMELINE_STEPS.get(
+            to_status,
+            (status_names.get(to_status, to_status), f'Order status changed to {status_names.get(to_status, to_status)}')
+        )
+        if to_status == 'shipped' and order.courier_service:
+            description = f'{description} via {order.courier_service}'
         timeline.append({
-            'status': 'delivered',
-            'title': 'Order Delivered',
-            'description': 'Your order has been delivered successfully',
-            'date': order.delivered_at,
+            'status': to_status,
+            'title': title,
+            'description': description,
+            'date': date,
             'completed': True
         })
     
-    return Response({
-        'order': OrderSerializer(order).data,
-        'timeline': timeline
-    })
+    return timeline
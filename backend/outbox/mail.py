@@ -0,0 +1,109 @@
+"""
+Queueing and delivery of outbound email.
+
+``queue_email()`` takes the same arguments as ``django.core.mail.send_mail``
+but only inserts an OutgoingEmail row, inside the caller's transaction: if
+the triggering change rolls back, so does the email, and nothing is sent
+before the change is committed.
+
+``send_due()`` is the worker side. It claims a batch of due rows with
+``SELECT ... FOR UPDATE SKIP LOCKED`` (so several workers never pick the same
+row) and pushes the claim forward by ``CLAIM_SECONDS`` before committing,
+then sends the batch over one SMTP connection outside any transaction.
+Failures are retried with exponential backoff until MAIL_OUTBOX_MAX_ATTEMPTS.
+Delivery is at-least-once: a worker that dies between sending and recording
+the result leaves the row to be sent again once its claim runs out.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+CLAIM_SECONDS = 300
+
+
+def queue_email(subject, message, recipient_list, html_message=None, from_email=None):
+    """Store an email for run_mail_worker to send once the transaction commits."""
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=message,
+        html_body=html_message or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+        recipients=list(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the given number of failed attempts."""
+    return min(settings.MAIL_OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.MAIL_OUTBOX_RETRY_MAX_SECONDS)
+
+
+def claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if batch:
+            OutgoingEmail.objects.filter(id__in=[email.id for email in batch]).update(
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS),
+            )
+    for email in batch:
+        email.attempts += 1
+    return batch
+
+
+def send_due(connection, batch_size=50):
+    """
+    Send one batch of due emails over ``connection`` (an email backend,
+    opened on demand and left open for the next batch).
+    Returns ``(sent, failed)`` counts; ``(0, 0)`` means the queue is drained.
+    """
+    sent = failed = 0
+    for email in claim_batch(batch_size):
+        message = EmailMultiAlternatives(
+            subject=email.subject,
+            body=email.body,
+            from_email=email.from_email or None,
+            to=email.recipients,
+            connection=connection,
+        )
+        if email.html_body:
+            message.attach_alternative(email.html_body, 'text/html')
+
+        try:
+            # No-op while the connection from the previous email is still open
+            connection.open()
+            message.send()
+        except Exception as e:
+            failed += 1
+            _record_failure(email, e)
+            # The SMTP session may be unusable now; reconnect for the next one
+            connection.close()
+            continue
+
+        sent += 1
+        OutgoingEmail.objects.filter(id=email.id).update(status='sent', sent_at=timezone.now(), last_error='')
+    return sent, failed
+
+
+def _record_failure(email, error):
+    if email.attempts >= settings.MAIL_OUTBOX_MAX_ATTEMPTS:
+        logger.error(f"Giving up on email {email.id} after {email.attempts} attempts: {error}")
+        changes = {'status': 'failed'}
+    else:
+        delay = retry_delay(email.attempts)
+        logger.warning(f"Email {email.id} failed (attempt {email.attempts}), retrying in {delay}s: {error}")
+        changes = {'next_attempt_at': timezone.now() + timedelta(seconds=delay)}
+    OutgoingEmail.objects.filter(id=email.id).update(last_error=str(error), **changes)
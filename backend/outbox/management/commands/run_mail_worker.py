@@ -0,0 +1,50 @@
+import time
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from outbox.mail import send_due
+
+
+class Command(BaseCommand):
+    """
+    Send queued outbound email (see outbox/mail.py).
+
+    Runs until stopped, reusing one SMTP connection while there is work and
+    closing it when the queue is empty. Several workers can run side by side.
+
+    Usage:
+        python manage.py run_mail_worker
+        python manage.py run_mail_worker --batch-size 100 --poll-interval 5
+        python manage.py run_mail_worker --once      # drain the queue and exit
+    """
+    help = 'Deliver emails from the outbox table in batches over a reused SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once no email is due')
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+        total_sent = total_failed = 0
+
+        try:
+            while True:
+                sent, failed = send_due(connection, batch_size=options['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f"Sent {sent}, failed {failed}")
+                    continue
+
+                # Nothing due: don't hold an idle SMTP session open
+                connection.close()
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Mail worker stopped. {total_sent} sent, {total_failed} failed."))
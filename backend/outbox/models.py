@@ -0,0 +1,42 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class OutgoingEmail(models.Model):
+    """
+    Transactional outbox for email.
+    Rows are written with queue_email() in the same transaction as the change
+    that triggers the mail, so a request only waits for the INSERT. The
+    run_mail_worker command sends them afterwards, retrying with backoff.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.JSONField(default=list)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # When a worker may pick the email up (next retry, or end of a worker's claim)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(map(str, self.recipients))} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Workers only ever scan the pending rows that are due
+            models.Index(fields=['next_attempt_at'], condition=Q(status='pending'), name='outbox_pending_due_idx'),
+        ]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment
+from .models import Payment, Refund, StripeEvent
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -38,3 +38,25 @@ class PaymentAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'type', 'payment_intent_id', 'status', 'attempts', 'stripe_created_at', 'processed_at']
+    list_filter = ['status', 'type', 'received_at']
+    search_fields = ['id', 'payment_intent_id']
+    readonly_fields = [
+        'id', 'type', 'payment_intent_id', 'payload', 'stripe_created_at',
+        'attempts', 'last_error', 'received_at', 'processed_at'
+    ]
+
+
+@admin.register(Refund)
+class RefundAdmin(admin.ModelAdmin):
+    list_display = ['refund_id', 'payment', 'amount', 'reason', 'status', 'restock', 'created_by', 'created_at', 'processed_at']
+    list_filter = ['status', 'reason', 'created_at']
+    search_fields = ['refund_id', 'stripe_refund_id', 'payment__payment_id', 'payment__order__order_number']
+    readonly_fields = [
+        'refund_id', 'payment', 'amount', 'reason', 'note', 'lines', 'restock', 'status',
+        'stripe_refund_id', 'failure_reason', 'created_by', 'created_at', 'processed_at'
+    ]
@@ -0,0 +1,310 @@
+"""
+A local stand-in for the parts of the Stripe API that StripeService uses,
+for load and integration tests without network access or a Stripe account.
+
+Start it with ``python manage.py run_fake_stripe`` and point the app at it
+with ``STRIPE_API_BASE=http://127.0.0.1:12111``. Implemented:
+
+    POST /v1/payment_intents                  create
+    GET  /v1/payment_intents                  list (created[gte], limit, starting_after)
+    GET  /v1/payment_intents/<id>             retrieve
+    POST /v1/payment_intents/<id>/confirm     pay (what Stripe.js does in the browser)
+    POST /v1/payment_intents/<id>/cancel      cancel
+    POST /v1/refunds                          refund a succeeded intent
+
+Idempotency keys are honoured (same key, same response). Confirming or
+cancelling an intent sends the matching ``payment_intent.*`` event to the
+webhook URL, signed like Stripe does, so the whole checkout path runs.
+
+Latency and failures are injected per request: a fixed plus random delay,
+and given fractions of 500s, 429s, and hangs longer than the client's read
+timeout. ``decline_rate`` makes that fraction of confirmations fail as if
+the card was declined.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import random
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from urllib.request import Request, urlopen
+
+logger = logging.getLogger(__name__)
+
+
+def decode_form(body):
+    """Decode Stripe's form encoding (``metadata[order_id]=1``) into nested dicts."""
+    params = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = re.findall(r'[^\[\]]+', key)
+        target = params
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return params
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """The Stripe-Signature header value for ``payload`` (bytes)."""
+    timestamp = timestamp or int(time.time())
+    signed = f"{timestamp}.".encode() + payload
+    signature = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+class FakeStripe:
+    """In-memory Stripe state plus the failure and latency knobs."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 hang_rate=0.0, hang_seconds=30.0, decline_rate=0.0,
+                 webhook_url=None, webhook_secret=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.decline_rate = decline_rate
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.intents = {}
+        self.refunds = {}
+        self.idempotent_responses = {}
+        self.stats = {'requests': 0, 'errors_injected': 0, 'webhooks_sent': 0, 'webhooks_failed': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    # --- request handling -------------------------------------------------
+
+    def handle(self, method, path, params, idempotency_key):
+        """Return ``(status, body)`` for one API request."""
+        with self._lock:
+            self.stats['requests'] += 1
+            if idempotency_key and (method, path, idempotency_key) in self.idempotent_responses:
+                return self.idempotent_responses[method, path, idempotency_key]
+
+        delay = self.latency + random.uniform(0, self.jitter)
+        roll = random.random()
+        if roll < self.hang_rate:
+            # Longer than the client waits: exercises its read timeout
+            delay += self.hang_seconds
+        if delay:
+            time.sleep(delay)
+        if roll < self.hang_rate + self.error_rate:
+            self._count('errors_injected')
+            return 500, self._error('api_error', 'Injected failure')
+        if roll < self.hang_rate + self.error_rate + self.rate_limit_rate:
+            self._count('errors_injected')
+            return 429, self._error('rate_limit_error', 'Injected rate limit', code='rate_limit')
+
+        response = self._route(method, path, params)
+        if idempotency_key and method == 'POST' and response[0] < 500:
+            with self._lock:
+                self.idempotent_responses[method, path, idempotency_key] = response
+        return response
+
+    def _route(self, method, path, params):
+        if method == 'POST' and path == '/v1/payment_intents':
+            return self.create_intent(params)
+        if method == 'GET' and path == '/v1/payment_intents':
+            return self.list_intents(params)
+        if method == 'POST' and path == '/v1/refunds':
+            return self.create_refund(params)
+        match = re.fullmatch(r'/v1/payment_intents/([^/]+)(?:/(confirm|cancel))?', path)
+        if match:
+            intent_id, action = match.groups()
+            if intent_id not in self.intents:
+                return 404, self._error('invalid_request_error', f"No such payment_intent: '{intent_id}'",
+                                        code='resource_missing')
+            if method == 'GET' and action is None:
+                return 200, self.intents[intent_id]
+            if method == 'POST' and action == 'confirm':
+                return self.confirm_intent(intent_id)
+            if method == 'POST' and action == 'cancel':
+                return self.cancel_intent(intent_id, params)
+        return 404, self._error('invalid_request_error', f"Unrecognized request URL ({method}: {path})")
+
+    @staticmethod
+    def _error(error_type, message, code=None):
+        error = {'type': error_type, 'message': message}
+        if code:
+            error['code'] = code
+        return {'error': error}
+
+    # --- resources --------------------------------------------------------
+
+    def create_intent(self, params):
+        try:
+            amount = int(params['amount'])
+        except (KeyError, ValueError):
+            return 400, self._error('invalid_request_error', 'Missing required param: amount.', code='parameter_missing')
+        intent_id = f"pi_fake_{secrets.token_hex(12)}"
+        intent = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'amount': amount,
+            'amount_received': 0,
+            'currency': params.get('currency', 'usd'),
+            'metadata': params.get('metadata', {}),
+            'client_secret': f"{intent_id}_secret_{secrets.token_hex(12)}",
+            'status': 'requires_payment_method',
+            'last_payment_error': None,
+            'cancellation_reason': None,
+            'created': int(time.time()),
+            'livemode': False,
+        }
+        with self._lock:
+            self.intents[intent_id] = intent
+        return 200, intent
+
+    def list_intents(self, params):
+        created_gte = int(params.get('created', {}).get('gte', 0))
+        limit = min(int(params.get('limit', 10)), 100)
+        with self._lock:
+            # Newest first, like Stripe
+            intents = sorted(self.intents.values(), key=lambda intent: (intent['created'], intent['id']), reverse=True)
+        intents = [intent for intent in intents if intent['created'] >= created_gte]
+        if params.get('starting_after'):
+            ids = [intent['id'] for intent in intents]
+            start = ids.index(params['starting_after']) + 1 if params['starting_after'] in ids else len(ids)
+            intents = intents[start:]
+        return 200, {
+            'object': 'list',
+            'url': '/v1/payment_intents',
+            'data': intents[:limit],
+            'has_more': len(intents) > limit,
+        }
+
+    def confirm_intent(self, intent_id):
+        with self._lock:
+            intent = self.intents[intent_id]
+            if intent['status'] not in ('requires_payment_method', 'requires_confirmation', 'requires_action'):
+                return 400, self._error('invalid_request_error',
+                                        f"This PaymentIntent's status is {intent['status']}.",
+                                        code='payment_intent_unexpected_state')
+            if random.random() < self.decline_rate:
+                intent['last_payment_error'] = {'code': 'card_declined', 'message': 'Your card was declined.'}
+                event_type = 'payment_intent.payment_failed'
+            else:
+                intent['status'] = 'succeeded'
+                intent['amount_received'] = intent['amount']
+                intent['last_payment_error'] = None
+                event_type = 'payment_intent.succeeded'
+            snapshot = dict(intent)
+        self.send_event(event_type, snapshot)
+        if event_type == 'payment_intent.payment_failed':
+            return 402, {'error': {'type': 'card_error', 'code': 'card_declined',
+                                   'message': 'Your card was declined.', 'payment_intent': snapshot}}
+        return 200, snapshot
+
+    def cancel_intent(self, intent_id, params):
+        with self._lock:
+            intent = self.intents[intent_id]
+            if intent['status'] in ('succeeded', 'canceled'):
+                return 400, self._error('invalid_request_error',
+                                        f"You cannot cancel this PaymentIntent because it has a status of {intent['status']}.",
+                                        code='payment_intent_unexpected_state')
+            intent['status'] = 'canceled'
+            intent['cancellation_reason'] = params.get('cancellation_reason')
+            snapshot = dict(intent)
+        self.send_event('payment_intent.canceled', snapshot)
+        return 200, snapshot
+
+    def create_refund(self, params):
+        with self._lock:
+            intent = self.intents.get(params.get('payment_intent'))
+            if intent is None:
+                return 404, self._error('invalid_request_error', 'No such payment_intent', code='resource_missing')
+            if intent['status'] != 'succeeded':
+                return 400, self._error('invalid_request_error', 'This PaymentIntent has not succeeded.',
+                                        code='charge_not_refundable')
+            refunded = sum(r['amount'] for r in self.refunds.values() if r['payment_intent'] == intent['id'])
+            amount = int(params.get('amount') or intent['amount'] - refunded)
+            if amount <= 0 or refunded + amount > intent['amount']:
+                return 400, self._error('invalid_request_error', 'Refund amount exceeds the remaining charge.',
+                                        code='amount_too_large')
+            refund = {
+                'id': f"re_fake_{secrets.token_hex(12)}",
+                'object': 'refund',
+                'amount': amount,
+                'currency': intent['currency'],
+                'payment_intent': intent['id'],
+                'reason': params.get('reason'),
+                'status': 'succeeded',
+                'created': int(time.time()),
+            }
+            self.refunds[refund['id']] = refund
+        return 200, refund
+
+    # --- webhooks ---------------------------------------------------------
+
+    def send_event(self, event_type, data_object):
+        """Deliver a signed event to the webhook URL in the background."""
+        if not self.webhook_url:
+            return
+        event = {
+            'id': f"evt_fake_{secrets.token_hex(12)}",
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'livemode': False,
+            'data': {'object': data_object},
+        }
+        threading.Thread(target=self._deliver, args=(event,), daemon=True).start()
+
+    def _deliver(self, event):
+        payload = json.dumps(event).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.webhook_secret:
+            headers['Stripe-Signature'] = sign_payload(payload, self.webhook_secret)
+        try:
+            with urlopen(Request(self.webhook_url, data=payload, headers=headers), timeout=10):
+                pass
+            self._count('webhooks_sent')
+        except Exception as e:
+            self._count('webhooks_failed')
+            logger.warning(f"Webhook {event['type']} for {event['data']['object']['id']} not delivered: {e}")
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def _serve(self, method):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else url.query
+        status, data = self.server.stripe.handle(
+            method, url.path, decode_form(body), self.headers.get('Idempotency-Key')
+        )
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Request-Id', f"req_fake_{secrets.token_hex(8)}")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._serve('GET')
+
+    def do_POST(self):
+        self._serve('POST')
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def make_server(stripe, host='127.0.0.1', port=12111):
+    """A threaded HTTP server serving ``stripe`` (a FakeStripe); call serve_forever()."""
+    server = ThreadingHTTPServer((host, port), FakeStripeHandler)
+    server.daemon_threads = True
+    server.stripe = stripe
+    return server
@@ -0,0 +1,134 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from orders.models import Order
+from orders.services import OrderService
+from payments.models import Payment
+from payments.services import StripeService
+from payments.stripe_client import StripeUnavailable
+
+# Payment states of a checkout that was never completed
+ABANDONED_PAYMENT_STATUSES = ('pending', 'failed', 'cancelled')
+
+
+class Command(BaseCommand):
+    """
+    Clean up abandoned Stripe checkouts: pending, unpaid orders older than
+    --hours whose payment never went through, or that never got a payment
+    (creating the Payment Intent failed).
+
+    Each batch first cancels the Stripe Payment Intents, so they can no longer
+    be paid. The orders are then cancelled through OrderService, which releases
+    any stock they reserved, and removed entirely with --delete.
+
+    Usage (e.g. hourly from cron):
+        python manage.py reap_stale_orders
+        python manage.py reap_stale_orders --hours 6 --batch-size 200 --delete
+        python manage.py reap_stale_orders --dry-run
+    """
+    help = 'Cancel stale pending Stripe checkouts, release their stock and delete or cancel the orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.STALE_ORDER_REAP_AFTER_HOURS,
+                            help='Reap checkouts older than this many hours')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+        parser.add_argument('--delete', action='store_true',
+                            help='Delete reaped orders instead of keeping them as cancelled')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be reaped')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        metrics = {
+            'scanned': 0, 'intents_cancelled': 0, 'skipped_paid': 0, 'stripe_errors': 0,
+            'orders_reaped': 0, 'orders_deleted': 0, 'units_released': 0, 'amount': Decimal('0'),
+        }
+        last_id = 0
+        batches = 0
+
+        while options['max_batches'] is None or batches < options['max_batches']:
+            # The status index narrows this to the (few) pending orders; walk
+            # them by id so orders skipped in one batch are not fetched again
+            batch = list(
+                Order.objects.filter(
+                    Q(payment__status__in=ABANDONED_PAYMENT_STATUSES)
+                    # A cart checkout whose payment intent was never created
+                    | Q(payment__isnull=True, payment_method='stripe'),
+                    status='pending', is_paid=False, created_at__lt=cutoff, id__gt=last_id,
+                ).order_by('id').values_list('id', 'payment__stripe_payment_intent_id')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            batches += 1
+            last_id = batch[-1][0]
+            metrics['scanned'] += len(batch)
+
+            if options['dry_run']:
+                continue
+
+            reapable = []
+            stripe_down = False
+            for order_id, intent_id in batch:
+                if not intent_id:
+                    reapable.append(order_id)
+                    continue
+                try:
+                    if StripeService.cancel_payment_intent(intent_id):
+                        metrics['intents_cancelled'] += 1
+                        reapable.append(order_id)
+                    else:
+                        # Paid after all - the webhook will confirm the order
+                        metrics['skipped_paid'] += 1
+                except StripeUnavailable as e:
+                    # Circuit open: the rest of the run would only fail too
+                    metrics['stripe_errors'] += 1
+                    self.stderr.write(f"Stopping: {e} (retry in {e.retry_after}s)")
+                    stripe_down = True
+                    break
+                except stripe.error.StripeError as e:
+                    metrics['stripe_errors'] += 1
+                    self.stderr.write(f"Could not cancel intent {intent_id} for order {order_id}: {e}")
+
+            if not reapable:
+                if stripe_down:
+                    break
+                continue
+
+            with transaction.atomic():
+                cancelled = OrderService.cancel_orders(
+                    reapable, source='system', note='Checkout abandoned', from_statuses=('pending',)
+                )
+                cancelled_ids = [order.id for order in cancelled]
+                metrics['orders_reaped'] += len(cancelled)
+                metrics['amount'] += sum((order.total_amount for order in cancelled), Decimal('0'))
+                metrics['units_released'] += sum(OrderService.order_quantities(
+                    [order.id for order in cancelled if order.stock_reserved]
+                ).values())
+
+                if options['delete']:
+                    # Payments, items and status events go with the orders
+                    Order.objects.filter(id__in=cancelled_ids).delete()
+                    metrics['orders_deleted'] += len(cancelled_ids)
+                else:
+                    Payment.objects.filter(
+                        order_id__in=cancelled_ids, status__in=ABANDONED_PAYMENT_STATUSES
+                    ).update(status='cancelled', failure_reason='Checkout abandoned', updated_at=timezone.now())
+
+            self.stdout.write(f"Batch {batches}: reaped {len(cancelled)} of {len(batch)} orders...")
+            if stripe_down:
+                break
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Dry run: {metrics['scanned']} stale checkouts would be reaped."))
+            return
+
+        metrics['seconds'] = round(time.monotonic() - started, 2)
+        summary = ', '.join(f"{key}={value}" for key, value in metrics.items())
+        self.stdout.write(self.style.SUCCESS(f"Done: {summary}"))
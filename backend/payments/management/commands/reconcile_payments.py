@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils import timezone
+from datetime import datetime, time as dt_time
+from payments.reconcile import reconcile
+from payments.stripe_client import StripeUnavailable
+
+
+class Command(BaseCommand):
+    """
+    Settle payments whose confirmation and webhook were both missed, by
+    reading their PaymentIntents back from Stripe (see payments/reconcile.py).
+
+    Usage (e.g. every 15 minutes from cron):
+        python manage.py reconcile_payments
+        python manage.py reconcile_payments --since 2025-01-01    # ignore the checkpoint
+    """
+    help = 'Page through recent Stripe PaymentIntents and apply their status to pending payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='List intents created since this date/datetime instead of the checkpoint')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None and parse_date(options['since']):
+                since = datetime.combine(parse_date(options['since']), dt_time.min)
+            if since is None:
+                raise CommandError(f"Invalid --since value: {options['since']}")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        started = time.monotonic()
+        try:
+            metrics = reconcile(since)
+        except StripeUnavailable as e:
+            raise CommandError(f"{e} (retry in {e.retry_after}s); the checkpoint was not moved")
+
+        metrics['seconds'] = round(time.monotonic() - started, 2)
+        summary = ', '.join(f"{key}={value}" for key, value in metrics.items())
+        self.stdout.write(self.style.SUCCESS(f"Done: {summary}"))
@@ -0,0 +1,67 @@
+from collections import Counter
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from payments.models import StripeEvent
+from payments.tasks import process_stripe_events, queue_stripe_event
+
+
+class Command(BaseCommand):
+    """
+    Re-run Stripe webhook events that failed (or any chosen events).
+
+    Usage:
+        python manage.py replay_stripe_events                      # all failed events
+        python manage.py replay_stripe_events --event evt_123 --event evt_456
+        python manage.py replay_stripe_events --since 2025-01-01 --sync
+    """
+    help = 'Reset failed Stripe webhook events to pending and process them again'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', action='append', dest='events', help='Event id (repeatable), any status')
+        parser.add_argument('--since', help='Only failed events received on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--sync', action='store_true', help='Process now instead of queueing for run_worker')
+
+    def handle(self, *args, **options):
+        if options['events']:
+            events = StripeEvent.objects.filter(id__in=options['events'])
+        else:
+            events = StripeEvent.objects.filter(status='failed')
+            if options['since']:
+                try:
+                    since = datetime.fromisoformat(options['since'])
+                except ValueError as e:
+                    raise CommandError(f"Invalid date: {e}")
+                events = events.filter(received_at__gte=timezone.make_aware(since))
+
+        events = list(events.order_by('stripe_created_at', 'received_at'))
+        if not events:
+            self.stdout.write(self.style.SUCCESS("No events to replay."))
+            return
+
+        # One run per payment intent is enough - it picks up all its pending events
+        runs = list({event.payment_intent_id or event.id: event for event in events}.values())
+
+        with transaction.atomic():
+            StripeEvent.objects.filter(id__in=[event.id for event in events]).update(
+                status='pending', attempts=0, last_error='', processed_at=None
+            )
+            if not options['sync']:
+                for event in runs:
+                    queue_stripe_event(event)
+
+        if options['sync']:
+            for event in runs:
+                try:
+                    process_stripe_events(payment_intent_id=event.payment_intent_id, event_id=event.id)
+                except Exception as e:
+                    self.stderr.write(f"Events of {event.payment_intent_id or event.id} failed again: {e}")
+
+        counts = Counter(
+            StripeEvent.objects.filter(id__in=[event.id for event in events]).values_list('status', flat=True)
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {len(events)} events: {counts['processed']} processed, "
+            f"{counts['pending']} pending, {counts['failed']} failed."
+        ))
@@ -0,0 +1,60 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from payments.fake_stripe import FakeStripe, make_server
+
+
+class Command(BaseCommand):
+    """
+    Serve a local fake of the Stripe API (see payments/fake_stripe.py) for
+    load and integration tests. Run the app with
+    STRIPE_API_BASE=http://127.0.0.1:12111 to use it.
+
+    Usage:
+        python manage.py run_fake_stripe
+        python manage.py run_fake_stripe --latency-ms 150 --jitter-ms 100 --error-rate 0.02
+        python manage.py run_fake_stripe --webhook-url http://127.0.0.1:8000/api/payments/webhook/
+        python manage.py run_fake_stripe --hang-rate 0.01 --decline-rate 0.05
+    """
+    help = 'Run a local fake Stripe API with configurable latency and failure injection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument('--latency-ms', type=float, default=0, help='Fixed delay added to every request')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='Random extra delay, up to this much')
+        parser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests answered with a 500')
+        parser.add_argument('--rate-limit-rate', type=float, default=0, help='Fraction answered with a 429')
+        parser.add_argument('--hang-rate', type=float, default=0,
+                            help='Fraction of requests that hang for --hang-seconds, then fail')
+        parser.add_argument('--hang-seconds', type=float, default=30)
+        parser.add_argument('--decline-rate', type=float, default=0, help='Fraction of confirmations declined')
+        parser.add_argument('--webhook-url', help='Where confirm/cancel events are delivered')
+        parser.add_argument('--webhook-secret', default=settings.STRIPE_WEBHOOK_SECRET,
+                            help='Secret events are signed with (default: STRIPE_WEBHOOK_SECRET)')
+
+    def handle(self, *args, **options):
+        stripe = FakeStripe(
+            latency=options['latency_ms'] / 1000,
+            jitter=options['jitter_ms'] / 1000,
+            error_rate=options['error_rate'],
+            rate_limit_rate=options['rate_limit_rate'],
+            hang_rate=options['hang_rate'],
+            hang_seconds=options['hang_seconds'],
+            decline_rate=options['decline_rate'],
+            webhook_url=options['webhook_url'],
+            webhook_secret=options['webhook_secret'],
+        )
+        server = make_server(stripe, options['host'], options['port'])
+        self.stdout.write(f"Fake Stripe listening on http://{options['host']}:{server.server_port}")
+        if options['webhook_url'] and not options['webhook_secret']:
+            self.stdout.write(self.style.WARNING("Webhooks are unsigned: the app only accepts them with DEBUG"))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+        self.stdout.write(self.style.SUCCESS(f"Fake Stripe stopped. {json.dumps(stripe.stats)}"))
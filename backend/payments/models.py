@@ -1,7 +1,7 @@
 from django.db import models
 from orders.models import Order
 from users.models import User
-import uuid
+from orders.identifiers import new_id
 
 class Payment(models.Model):
     """
@@ -13,6 +13,7 @@ class Payment(models.Model):
         ('succeeded', 'Succeeded'),
         ('failed', 'Failed'),
         ('cancelled', 'Cancelled'),
+        ('partially_refunded', 'Partially Refunded'),
         ('refunded', 'Refunded'),
     ]
 
@@ -23,9 +24,12 @@ class Payment(models.Model):
 
     # Primary identifiers
     payment_id = models.CharField(max_length=50, unique=True, blank=True)
-    stripe_payment_intent_id = models.CharField(max_length=200, blank=True, null=True)
+    # Indexed: webhooks, confirmation and reconcile_payments look payments up by intent
+    stripe_payment_intent_id = models.CharField(max_length=200, blank=True, null=True, db_index=True)
     
     # Relationships
+    # Partitioning orders_order replaces the database constraint with a
+    # trigger doing the same check (orders/partitioning.py)
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='payment')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments')
     
@@ -58,7 +62,7 @@ class Payment(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.payment_id:
-            self.payment_id = f"PAY-{uuid.uuid4().hex[:12].upper()}"
+            self.payment_id = f"PAY-{new_id()}"
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -66,4 +70,107 @@ class Payment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A user's payments, newest first (user_payments) as one index range scan
+            models.Index(fields=['user', '-created_at'], name='payments_user_created_idx'),
+        ]
 
+
+class StripeEvent(models.Model):
+    """
+    Every verified Stripe webhook event, keyed by Stripe's event id.
+    The webhook only stores the event and queues it; payments.tasks processes
+    the events of each payment intent in order. Stripe redeliveries hit the
+    primary key and are dropped.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.CharField(max_length=255, primary_key=True)
+    type = models.CharField(max_length=100)
+    payment_intent_id = models.CharField(max_length=200, blank=True, db_index=True)
+    payload = models.JSONField()
+    # Stripe's creation time (seconds resolution) - the processing order
+    stripe_created_at = models.DateTimeField()
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.id} {self.type} ({self.status})"
+
+    class Meta:
+        ordering = ['stripe_created_at', 'received_at']
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+
+
+class StripeSyncCheckpoint(models.Model):
+    """
+    Where a Stripe listing job (reconcile_payments) resumes: objects created
+    at or after ``created_since`` are listed on the next run.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    created_since = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} since {self.created_since}"
+
+
+class Refund(models.Model):
+    """
+    One refund of a payment. A payment can have several partial refunds;
+    their amounts never add up to more than the payment (payments/refunds.py
+    checks that under the payment's row lock). ``lines`` records the order
+    lines, and units of each, given back with the refund.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    # The reasons Stripe accepts
+    REASON_CHOICES = [
+        ('requested_by_customer', 'Requested by Customer'),
+        ('duplicate', 'Duplicate'),
+        ('fraudulent', 'Fraudulent'),
+    ]
+
+    refund_id = models.CharField(max_length=50, unique=True, blank=True)
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='refunds')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    reason = models.CharField(max_length=30, choices=REASON_CHOICES, default='requested_by_customer')
+    note = models.TextField(blank=True)
+    # [{"order_item_id": 1, "product_id": 2, "quantity": 1}, ...]
+    lines = models.JSONField(default=list, blank=True)
+    # Whether the refunded units go back on the shelf
+    restock = models.BooleanField(default=False)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    stripe_refund_id = models.CharField(max_length=200, blank=True)
+    failure_reason = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        if not self.refund_id:
+            self.refund_id = f"RF-{new_id()}"
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Refund {self.refund_id} - {self.amount} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
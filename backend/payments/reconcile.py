@@ -0,0 +1,160 @@
+"""
+Reconciliation of Payment rows with Stripe's PaymentIntents.
+
+A payment normally settles through confirm_payment (called by the browser)
+or the webhook. When both are missed it stays pending forever, so
+``reconcile_payments`` lists the PaymentIntents Stripe created since a
+stored checkpoint, a page of 100 at a time, and matches each page against
+``Payment.stripe_payment_intent_id`` with one query. Payments whose intent
+has moved on are updated together, and orders of newly paid payments are
+confirmed through OrderService in the same transaction.
+
+The Stripe list API filters on creation time only, so the checkpoint is the
+creation time of the oldest intent that could still change (not succeeded
+or canceled yet), capped at PAYMENT_RECONCILE_MAX_LOOKBACK_DAYS.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import Order
+from orders.services import OrderService
+from .models import Payment, StripeSyncCheckpoint
+from .status_stream import notify_payment_status
+from .stripe_client import call
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'payment_intents'
+PAGE_SIZE = 100
+
+# Intent states that never change again
+FINAL_INTENT_STATUSES = ('succeeded', 'canceled')
+# Payment states reconciliation may still move
+OPEN_PAYMENT_STATUSES = ('pending', 'processing', 'failed')
+
+
+def payment_status_for(intent):
+    """The Payment status an intent's state means, or None if still undecided."""
+    if intent.status == 'succeeded':
+        return 'succeeded'
+    if intent.status == 'canceled':
+        return 'cancelled'
+    if intent.status == 'processing':
+        return 'processing'
+    if intent.status == 'requires_payment_method' and intent.last_payment_error:
+        return 'failed'
+    return None
+
+
+def get_checkpoint():
+    checkpoint = StripeSyncCheckpoint.objects.filter(name=CHECKPOINT_NAME).first()
+    return checkpoint.created_since if checkpoint else None
+
+
+def save_checkpoint(created_since):
+    StripeSyncCheckpoint.objects.update_or_create(
+        name=CHECKPOINT_NAME, defaults={'created_since': created_since}
+    )
+
+
+def list_intents(since):
+    """Yield pages of the PaymentIntents created at or after ``since`` (newest first)."""
+    params = {'created': {'gte': int(since.timestamp())}, 'limit': PAGE_SIZE}
+    while True:
+        page = call('payment_intents', 'list', params=params)
+        if not page.data:
+            return
+        yield page.data
+        if not page.has_more:
+            return
+        params['starting_after'] = page.data[-1].id
+
+
+def apply_intents(intents):
+    """
+    Bring the open payments of ``intents`` (one listed page) in line with
+    Stripe. Returns a Counter of the transitions made, e.g.
+    ``{'pending->succeeded': 3}``.
+    """
+    by_id = {intent.id: intent for intent in intents}
+    transitions = Counter()
+    now = timezone.now()
+
+    with transaction.atomic():
+        payments = list(
+            Payment.objects.select_for_update()
+            .filter(stripe_payment_intent_id__in=list(by_id), status__in=OPEN_PAYMENT_STATUSES)
+            .only('id', 'payment_id', 'order_id', 'user_id', 'status', 'stripe_payment_intent_id', 'failure_reason')
+        )
+        changed = []
+        for payment in payments:
+            intent = by_id[payment.stripe_payment_intent_id]
+            new_status = payment_status_for(intent)
+            if new_status is None or new_status == payment.status:
+                continue
+            transitions[f"{payment.status}->{new_status}"] += 1
+            payment.status = new_status
+            payment.updated_at = now
+            if new_status == 'succeeded':
+                payment.paid_at = now
+            elif new_status == 'failed':
+                payment.failure_reason = getattr(intent.last_payment_error, 'message', None) or 'Payment failed'
+            elif new_status == 'cancelled':
+                payment.failure_reason = f"Payment intent canceled ({intent.cancellation_reason or 'no reason'})"
+            changed.append(payment)
+        if not changed:
+            return transitions
+
+        Payment.objects.bulk_update(changed, ['status', 'updated_at', 'paid_at', 'failure_reason'])
+        notify_payment_status(*[payment.payment_id for payment in changed])
+
+        paid = [payment for payment in changed if payment.status == 'succeeded']
+        if paid:
+            orders = OrderService.lock_orders(
+                Order.objects.filter(id__in=[payment.order_id for payment in paid], status='pending')
+            )
+            OrderService.set_status(
+                orders, 'confirmed', source='payment', note='Payment reconciled with Stripe',
+                now=now, extra={'is_paid': True, 'payment_date': now},
+            )
+            # Same as a confirmed checkout: the paid cart is emptied
+            from cart.models import Cart, CartItem
+            user_ids = {payment.user_id for payment in paid}
+            CartItem.objects.filter(cart__user_id__in=user_ids).delete()
+            Cart.objects.filter(user_id__in=user_ids).update(promo_code=None, discount_amount=0, updated_at=now)
+
+    logger.info(f"Reconciled {len(changed)} payments with Stripe: {dict(transitions)}")
+    return transitions
+
+
+def reconcile(since=None):
+    """
+    Reconcile every PaymentIntent created since ``since`` (default: the
+    stored checkpoint) and move the checkpoint forward.
+    Returns a dict of metrics.
+    """
+    started = timezone.now()
+    oldest = started - timedelta(days=settings.PAYMENT_RECONCILE_MAX_LOOKBACK_DAYS)
+    since = since or get_checkpoint() or oldest
+    metrics = Counter(pages=0, intents=0)
+    oldest_open = None
+
+    for page in list_intents(since):
+        metrics['pages'] += 1
+        metrics['intents'] += len(page)
+        metrics.update(apply_intents(page))
+        for intent in page:
+            if intent.status not in FINAL_INTENT_STATUSES:
+                created = datetime.fromtimestamp(intent.created, tz=dt_timezone.utc)
+                oldest_open = created if oldest_open is None else min(oldest_open, created)
+
+    # Resume from the oldest intent that can still change; with none, from
+    # shortly before this run (intents created meanwhile may not be listed yet)
+    checkpoint = oldest_open or started - timedelta(minutes=1)
+    save_checkpoint(max(checkpoint, oldest))
+    return {'since': since.isoformat(), **metrics}
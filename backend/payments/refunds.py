@@ -0,0 +1,270 @@
+"""
+Refunds of Stripe payments, recorded in the Refund ledger.
+
+A refund goes through three steps:
+
+1. ``prepare_refund`` locks the payment, checks the amount against what is
+   left after earlier pending and succeeded refunds, reserves the refunded
+   order lines (``OrderItem.refunded_quantity``) and inserts a pending
+   Refund. Concurrent refunds of one payment queue on its row lock, so they
+   can never add up to more than was paid.
+2. ``submit_refund`` asks Stripe for the money back. It touches no database
+   connection, so ``refund_batch`` runs it on REFUND_BATCH_CONCURRENCY
+   threads; the idempotency key is the refund id, so a retried or repeated
+   submission refunds once.
+3. ``record_refund`` settles the Refund. A payment refunded in full becomes
+   ``refunded`` and its order is cancelled (``returned`` once delivered),
+   otherwise it becomes ``partially_refunded``. The refunded units go back
+   on the shelf if the order had taken them; a refund Stripe declined
+   releases the lines it reserved. When Stripe could not be reached the
+   refund stays pending (Stripe may have made it) and is submitted again,
+   with the same idempotency key, through ``refund_batch(retry_refund_ids=...)``.
+
+Only orders that took their units off the shelf (``stock_reserved``) and
+were not cancelled yet (cancelling restocked everything) restock on
+refund; ``Refund.restock`` records that decision, made under the order's
+lock.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from orders.services import OrderService
+from .models import Payment, Refund
+from .stripe_client import StripeUnavailable, call
+
+logger = logging.getLogger(__name__)
+
+# Payment statuses that can still be refunded
+REFUNDABLE_PAYMENT_STATUSES = ('succeeded', 'partially_refunded')
+
+
+class RefundError(Exception):
+    """The refund cannot be made as requested (nothing was written)."""
+
+
+def refundable_amount(payment):
+    """What is left to refund of ``payment`` after pending and succeeded refunds."""
+    reserved = payment.refunds.filter(status__in=('pending', 'succeeded')).aggregate(total=Sum('amount'))['total']
+    return payment.amount - (reserved or Decimal('0'))
+
+
+def _reserve_lines(order_id, items, whole_order):
+    """
+    Lock the order's lines and add the refunded units to their
+    ``refunded_quantity``. ``items`` maps order_item_id -> units; with
+    ``whole_order`` every unit not refunded yet is taken instead.
+    Returns the ledger lines.
+    """
+    order_items = OrderItem.objects.select_for_update().filter(order_id=order_id).order_by('id')
+    if not whole_order:
+        order_items = order_items.filter(id__in=list(items))
+    order_items = list(order_items.only('id', 'product_id', 'quantity', 'refunded_quantity'))
+
+    missing = set(items) - {item.id for item in order_items}
+    if missing:
+        raise RefundError(f"Order items {sorted(missing)} are not part of this order")
+
+    lines = []
+    for item in order_items:
+        available = item.quantity - item.refunded_quantity
+        quantity = available if whole_order else items[item.id]
+        if quantity > available:
+            raise RefundError(f"Only {available} units of order item {item.id} can still be refunded")
+        if quantity > 0:
+            lines.append({'order_item_id': item.id, 'product_id': item.product_id, 'quantity': quantity})
+
+    for line in lines:
+        OrderItem.objects.filter(id=line['order_item_id']).update(
+            refunded_quantity=F('refunded_quantity') + line['quantity']
+        )
+    return lines
+
+
+def _release_lines(lines):
+    for line in lines:
+        OrderItem.objects.filter(id=line['order_item_id']).update(
+            refunded_quantity=F('refunded_quantity') - line['quantity']
+        )
+
+
+def _line_quantities(lines):
+    quantities = {}
+    for line in lines:
+        if line['product_id'] is not None:
+            quantities[line['product_id']] = quantities.get(line['product_id'], 0) + line['quantity']
+    return quantities
+
+
+def prepare_refund(payment_id, amount=None, reason='requested_by_customer', note='', items=None, created_by=None):
+    """
+    Validate a refund of ``payment_id`` and record it as pending.
+
+    ``amount`` defaults to everything still refundable. ``items`` maps
+    order_item_id -> units being given back; a refund of the whole
+    remaining amount without ``items`` gives back every unit not refunded
+    yet. Raises RefundError, leaving nothing behind, if the refund is not
+    possible.
+    """
+    items = items or {}
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update().filter(payment_id=payment_id).first()
+        if payment is None:
+            raise RefundError("Payment not found")
+        if payment.status not in REFUNDABLE_PAYMENT_STATUSES:
+            raise RefundError(f"Cannot refund a payment that is {payment.status}")
+        if not payment.stripe_payment_intent_id:
+            raise RefundError("Payment was not made through Stripe")
+
+        remaining = refundable_amount(payment)
+        amount = remaining if amount is None else Decimal(amount)
+        if amount <= 0 or amount > remaining:
+            raise RefundError(f"Refund amount must be between 0.01 and {remaining}")
+
+        # Locked so a cancellation cannot restock the lines in between
+        order = Order.objects.select_for_update().only('id', 'status', 'stock_reserved').get(id=payment.order_id)
+
+        lines = []
+        whole_order = amount == remaining and not items
+        if items or whole_order:
+            lines = _reserve_lines(payment.order_id, items, whole_order)
+
+        refund = Refund.objects.create(
+            payment=payment, amount=amount, reason=reason, note=note,
+            lines=lines, restock=order.stock_reserved and order.status != 'cancelled',
+            created_by=created_by,
+        )
+    return refund
+
+
+def submit_refund(refund):
+    """
+    Ask Stripe to refund ``refund`` (from prepare_refund). Thread-safe and
+    free of database access. Returns ``(stripe_refund_id, error, retryable)``;
+    ``retryable`` is set when Stripe was unavailable rather than declining.
+    """
+    try:
+        stripe_refund = call('refunds', 'create', params={
+            'payment_intent': refund.payment.stripe_payment_intent_id,
+            'amount': int(refund.amount * 100),
+            'reason': refund.reason,
+            'metadata': {'refund_id': refund.refund_id, 'payment_id': refund.payment.payment_id},
+        }, idempotency_key=f"refund-{refund.refund_id}")
+    except StripeUnavailable as e:
+        logger.warning(f"Stripe refund {refund.refund_id} not submitted, left pending: {e}")
+        return None, str(e), True
+    except stripe.error.StripeError as e:
+        logger.error(f"Stripe refund {refund.refund_id} failed: {e}")
+        return None, str(e), False
+    return stripe_refund.id, None, False
+
+
+def record_refund(refund, stripe_refund_id, error=None, retryable=False):
+    """
+    Store the outcome of submit_refund and update the payment, its order
+    and the stock accordingly. Returns the updated Refund.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Payment first, then refund: the same lock order as prepare_refund
+        payment = Payment.objects.select_for_update().get(id=refund.payment_id)
+        refund = Refund.objects.select_for_update().get(id=refund.id)
+        refund.payment = payment
+        if refund.status != 'pending':
+            return refund
+        if error and retryable:
+            refund.failure_reason = error
+            refund.save(update_fields=['failure_reason'])
+            return refund
+        order = Order.objects.only('id', 'status', 'stock_reserved').get(id=payment.order_id)
+
+        refund.processed_at = now
+        if error:
+            refund.status = 'failed'
+            refund.failure_reason = error
+            refund.save(update_fields=['status', 'failure_reason', 'processed_at'])
+            _release_lines(refund.lines)
+            if refund.restock and order.status == 'cancelled':
+                # The order was cancelled meanwhile, skipping these units
+                OrderService.restore_stock(_line_quantities(refund.lines))
+            return refund
+
+        refund.status = 'succeeded'
+        refund.stripe_refund_id = stripe_refund_id
+        refund.failure_reason = ''
+        refund.save(update_fields=['status', 'stripe_refund_id', 'failure_reason', 'processed_at'])
+
+        refunded = payment.refunds.filter(status='succeeded').aggregate(total=Sum('amount'))['total']
+        payment.status = 'refunded' if refunded >= payment.amount else 'partially_refunded'
+        payment.refund_reason = refund.note or refund.get_reason_display()
+        payment.save(update_fields=['status', 'refund_reason', 'updated_at'])
+
+        if refund.restock:
+            OrderService.restore_stock(_line_quantities(refund.lines))
+        if payment.status == 'refunded':
+            orders = OrderService.lock_orders(Order.objects.filter(id=order.id).exclude(status__in=('cancelled', 'returned')))
+            new_status = 'returned' if order.status == 'delivered' else 'cancelled'
+            OrderService.set_status(
+                orders, new_status, source='payment', note=f"Payment {payment.payment_id} refunded", now=now,
+            )
+
+    logger.info(f"Refund {refund.refund_id} of {refund.amount} for payment {payment.payment_id}: {refund.status}")
+    return refund
+
+
+def refund_batch(requests=(), retry_refund_ids=(), created_by=None):
+    """
+    Refund many payments at once. ``requests`` are dicts with
+    ``payment_id`` and optionally ``amount``, ``reason``, ``note`` and
+    ``items``; ``retry_refund_ids`` names pending refunds to submit again.
+    Stripe is called for up to REFUND_BATCH_CONCURRENCY refunds at a time.
+    Returns one result dict per request, then per retried refund, in order.
+    """
+    results = []
+    prepared = []
+    for request in requests:
+        try:
+            refund = prepare_refund(created_by=created_by, **request)
+        except RefundError as e:
+            results.append({'payment_id': request['payment_id'], 'status': 'rejected', 'error': str(e)})
+            continue
+        prepared.append((len(results), refund))
+        results.append(None)
+
+    retry_refund_ids = list(dict.fromkeys(retry_refund_ids))
+    pending = {
+        refund.refund_id: refund
+        for refund in Refund.objects.select_related('payment').filter(refund_id__in=retry_refund_ids, status='pending')
+    }
+    for refund_id in retry_refund_ids:
+        if refund_id in pending:
+            prepared.append((len(results), pending[refund_id]))
+            results.append(None)
+        else:
+            results.append({'refund_id': refund_id, 'status': 'rejected', 'error': 'No pending refund with this id'})
+
+    if not prepared:
+        return results
+
+    workers = min(settings.REFUND_BATCH_CONCURRENCY, len(prepared))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='refund') as executor:
+        outcomes = list(executor.map(submit_refund, [refund for _, refund in prepared]))
+
+    for (index, refund), outcome in zip(prepared, outcomes):
+        refund = record_refund(refund, *outcome)
+        results[index] = {
+            'payment_id': refund.payment.payment_id,
+            'refund_id': refund.refund_id,
+            'status': refund.status,
+            'amount': str(refund.amount),
+            'lines': refund.lines,
+            'error': refund.failure_reason or None,
+        }
+    return results
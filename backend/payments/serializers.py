@@ -1,5 +1,6 @@
+from decimal import Decimal
 from rest_framework import serializers
-from .models import Payment
+from .models import Payment, Refund
 
 class PaymentSerializer(serializers.ModelSerializer):
     """
@@ -24,6 +25,17 @@ class PaymentSerializer(serializers.ModelSerializer):
             'paid_at',
         ]
 
+class UserPaymentSerializer(PaymentSerializer):
+    """
+    Payment in the user's payment history, with the order it paid for
+    (load with select_related('order'))
+    """
+    order_number = serializers.CharField(source='order.order_number', read_only=True)
+    order_status = serializers.CharField(source='order.status', read_only=True)
+
+    class Meta(PaymentSerializer.Meta):
+        fields = PaymentSerializer.Meta.fields + ['order_number', 'order_status']
+
 class CreatePaymentIntentSerializer(serializers.Serializer):
     """
     Serializer for creating payment intent
@@ -54,3 +66,43 @@ class ConfirmPaymentSerializer(serializers.Serializer):
     """
     payment_intent_id = serializers.CharField()
     payment_id = serializers.CharField()
+
+class RefundItemSerializer(serializers.Serializer):
+    order_item_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class RefundRequestSerializer(serializers.Serializer):
+    """
+    One refund of an admin batch. Without ``amount`` everything still
+    refundable is refunded; ``items`` are the order lines given back.
+    """
+    payment_id = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'), required=False)
+    reason = serializers.ChoiceField(choices=Refund.REASON_CHOICES, default='requested_by_customer')
+    note = serializers.CharField(allow_blank=True, default='')
+    items = RefundItemSerializer(many=True, required=False)
+
+    def validate_items(self, value):
+        items = {}
+        for item in value:
+            if item['order_item_id'] in items:
+                raise serializers.ValidationError(f"Order item {item['order_item_id']} is listed twice")
+            items[item['order_item_id']] = item['quantity']
+        return items
+
+class BatchRefundSerializer(serializers.Serializer):
+    """
+    POST /api/payments/admin/refunds/ body
+    """
+    MAX_REFUNDS = 100
+
+    refunds = RefundRequestSerializer(many=True, default=list)
+    retry_refund_ids = serializers.ListField(child=serializers.CharField(), default=list)
+
+    def validate(self, attrs):
+        count = len(attrs['refunds']) + len(attrs['retry_refund_ids'])
+        if not count:
+            raise serializers.ValidationError("Provide refunds or retry_refund_ids")
+        if count > self.MAX_REFUNDS:
+            raise serializers.ValidationError(f"At most {self.MAX_REFUNDS} refunds per batch")
+        return attrs
@@ -1,13 +1,11 @@
 import stripe
 import logging
-from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from .models import Payment
+from .stripe_client import call
 from orders.models import Order
 
-# Configure Stripe
-stripe.api_key = settings.STRIPE_SECRET_KEY
-
 logger = logging.getLogger(__name__)
 
 class StripeService:
@@ -31,7 +29,7 @@ class StripeService:
             if existing_payment and existing_payment.stripe_payment_intent_id:
                 # Try to retrieve the existing payment intent from Stripe
                 try:
-                    intent = stripe.PaymentIntent.retrieve(existing_payment.stripe_payment_intent_id)
+                    intent = call('payment_intents', 'retrieve', existing_payment.stripe_payment_intent_id)
                     if intent.status in ['requires_payment_method', 'requires_confirmation', 'requires_action']:
                         logger.info(f"Returning existing payment intent for order: {order.id}")
                         return existing_payment, intent
@@ -46,15 +44,15 @@ class StripeService:
             amount_cents = int(order.total_amount * 100)
             
             # Create payment intent
-            intent = stripe.PaymentIntent.create(
-                amount=amount_cents,
-                currency='usd',
-                metadata={
+            intent = call('payment_intents', 'create', params={
+                'amount': amount_cents,
+                'currency': 'usd',
+                'metadata': {
                     'order_id': order.id,
                     'user_id': user.id,
                     'order_number': order.order_number,
-                }
-            )
+                },
+            })
             
             # Create Payment record
             payment = Payment.objects.create(
@@ -84,34 +82,37 @@ class StripeService:
         """
         try:
             # Retrieve payment intent from Stripe
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            intent = call('payment_intents', 'retrieve', payment_intent_id)
             
             # Find payment record
             payment = Payment.objects.get(stripe_payment_intent_id=payment_intent_id)
             
             if intent.status == 'succeeded':
-                payment.status = 'succeeded'
-                payment.paid_at = timezone.now()
-                payment.save()
+                # One transaction: the payment's status notification is
+                # delivered on commit, when the order is already paid
+                with transaction.atomic():
+                    payment.status = 'succeeded'
+                    payment.paid_at = timezone.now()
+                    payment.save()
                 
-                # Update order
-                order = payment.order
-                order.is_paid = True
-                order.payment_date = timezone.now()
-                order.status = 'confirmed'
-                order.save()
+                    # Update order
+                    order = payment.order
+                    order.is_paid = True
+                    order.payment_date = timezone.now()
+                    order.change_status('confirmed', source='payment', note=f"Payment {payment.payment_id} succeeded")
+                    order.save()
                 
-                # Clear user's cart after successful payment
-                from cart.models import Cart
-                try:
-                    user_cart = Cart.objects.get(user=payment.user)
-                    user_cart.items.all().delete()
-                    user_cart.promo_code = None
-                    user_cart.discount_amount = 0
-                    user_cart.save()
-                    logger.info(f"Cart cleared for user {payment.user.id} after successful payment")
-                except Cart.DoesNotExist:
-                    logger.info(f"No cart found for user {payment.user.id}")
+                    # Clear user's cart after successful payment
+                    from cart.models import Cart
+                    try:
+                        user_cart = Cart.objects.get(user=payment.user)
+                        user_cart.items.all().delete()
+                        user_cart.promo_code = None
+                        user_cart.discount_amount = 0
+                        user_cart.save()
+                        logger.info(f"Cart cleared for user {payment.user.id} after successful payment")
+                    except Cart.DoesNotExist:
+                        logger.info(f"No cart found for user {payment.user.id}")
                 
                 return payment, True
             else:
@@ -131,39 +132,39 @@ class StripeService:
             raise
     
     @staticmethod
-    def create_refund(payment, amount=None, reason=None):
+    def cancel_payment_intent(payment_intent_id, reason='abandoned'):
         """
-        Create a refund for a payment
+        Cancel a Payment Intent that is not going to be paid.
+        Returns True if the intent is cancelled (now or earlier) or unknown to
+        Stripe, False if it can no longer be cancelled (succeeded or processing).
         """
         try:
-            if payment.status != 'succeeded':
-                raise Exception("Can only refund succeeded payments")
-            
-            refund_amount = int((amount or payment.amount) * 100)
-            
-            refund = stripe.Refund.create(
-                payment_intent=payment.stripe_payment_intent_id,
-                amount=refund_amount,
-                reason=reason or 'requested_by_customer'
-            )
-            
-            payment.status = 'refunded'
-            payment.refund_reason = reason
-            payment.save()
-            
-            # Update order status
-            order = payment.order
-            order.status = 'cancelled'
-            order.save()
-            
-            return refund
-            
-        except stripe.error.StripeError as e:
-            logger.error(f"Stripe error creating refund: {e}")
-            raise Exception(f"Refund error: {str(e)}")
-        except Exception as e:
-            logger.error(f"Error creating refund: {e}")
-            raise
+            call('payment_intents', 'cancel', payment_intent_id,
+                 params={'cancellation_reason': reason}, idempotency_key=f"cancel-{payment_intent_id}")
+            return True
+        except stripe.error.InvalidRequestError as e:
+            if e.code == 'resource_missing':
+                return True
+            # Finished intents cannot be cancelled - check which way they went
+            intent = call('payment_intents', 'retrieve', payment_intent_id)
+            return intent.status == 'canceled'
+    
+    @staticmethod
+    def create_refund(payment, amount=None, reason=None, items=None, created_by=None):
+        """
+        Refund a payment (in full by default) and record it in the Refund
+        ledger; see payments/refunds.py. Returns the Refund.
+        """
+        from .refunds import prepare_refund, record_refund, submit_refund
+
+        refund = prepare_refund(
+            payment.payment_id, amount=amount, note=reason or '', items=items, created_by=created_by,
+        )
+        stripe_refund_id, error, retryable = submit_refund(refund)
+        refund = record_refund(refund, stripe_refund_id, error, retryable)
+        if refund.status == 'failed':
+            raise Exception(f"Refund error: {refund.failure_reason}")
+        return refund
 
     @staticmethod
     def handle_webhook_event(event):
@@ -182,31 +183,33 @@ class StripeService:
                 try:
                     payment = Payment.objects.get(stripe_payment_intent_id=payment_intent_id)
                     
-                    # Only update if payment is still pending to avoid duplicate processing
-                    if payment.status == 'pending':
-                        payment.status = 'succeeded'
-                        payment.paid_at = timezone.now()
-                        payment.save()
+                    # Only update if payment is not settled yet to avoid duplicate processing
+                    # (a declined attempt can be followed by a successful one on the same intent)
+                    if payment.status in ('pending', 'failed'):
+                        with transaction.atomic():
+                            payment.status = 'succeeded'
+                            payment.paid_at = timezone.now()
+                            payment.save()
                         
-                        # Update order
-                        order = payment.order
-                        if order.status == 'pending':
-                            order.is_paid = True
-                            order.payment_date = timezone.now()
-                            order.status = 'confirmed'
-                            order.save()
+                            # Update order
+                            order = payment.order
+                            if order.status == 'pending':
+                                order.is_paid = True
+                                order.payment_date = timezone.now()
+                                order.change_status('confirmed', source='webhook', note=f"Payment {payment.payment_id} succeeded")
+                                order.save()
                             
-                            # Clear user's cart after successful payment
-                            from cart.models import Cart
-                            try:
-                                user_cart = Cart.objects.get(user=payment.user)
-                                user_cart.items.all().delete()
-                                user_cart.promo_code = None
-                                user_cart.discount_amount = 0
-                                user_cart.save()
-                                logger.info(f"Cart cleared for user {payment.user.id} via webhook")
-                            except Cart.DoesNotExist:
-                                logger.info(f"No cart found for user {payment.user.id}")
+                                # Clear user's cart after successful payment
+                                from cart.models import Cart
+                                try:
+                                    user_cart = Cart.objects.get(user=payment.user)
+                                    user_cart.items.all().delete()
+                                    user_cart.promo_code = None
+                                    user_cart.discount_amount = 0
+                                    user_cart.save()
+                                    logger.info(f"Cart cleared for user {payment.user.id} via webhook")
+                                except Cart.DoesNotExist:
+                                    logger.info(f"No cart found for user {payment.user.id}")
                         
                         logger.info(f"Payment {payment.payment_id} successfully processed via webhook")
                     else:
@@ -221,8 +224,11 @@ class StripeService:
                 
                 try:
                     payment = Payment.objects.get(stripe_payment_intent_id=payment_intent_id)
+                    if payment.status in ('succeeded', 'refunded'):
+                        logger.info(f"Payment {payment.payment_id} already settled, ignoring failure event")
+                        return
                     payment.status = 'failed'
-                    payment.failure_reason = payment_intent.get('last_payment_error', {}).get('message', 'Payment failed')
+                    payment.failure_reason = (payment_intent.get('last_payment_error') or {}).get('message', 'Payment failed')
                     payment.save()
                     
                     logger.info(f"Payment {payment.payment_id} marked as failed via webhook")
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import Payment
+from .status_stream import notify_payment_status
+
+
+@receiver(post_save, sender=Payment)
+def announce_payment_change(sender, instance, **kwargs):
+    """Wake up status streams waiting on this payment (sent when the transaction commits)"""
+    notify_payment_status(instance.payment_id)
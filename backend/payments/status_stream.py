@@ -0,0 +1,203 @@
+"""
+Push payment status changes to waiting checkouts (Server-Sent Events).
+
+Writers call ``notify_payment_status()`` (Payment.save does it through a
+post_save receiver, set-based updates call it themselves). That is a
+PostgreSQL ``NOTIFY``, so it is delivered when the transaction commits, and
+to every app process.
+
+Each process runs one listener thread with its own ``LISTEN`` connection
+and fans notifications out to the streams subscribed to that payment.
+A stream then re-reads the payment's status with one small query and
+pushes it if it changed, so the notification carries nothing but the id.
+
+The stream view is async and must be served over ASGI (uvicorn, see the
+README), where an open stream costs a coroutine and a queue, not a worker
+thread. A WSGI server would collect the whole async stream before sending
+a byte, so under WSGI (runserver) the view answers 501 and clients keep
+polling payment-status.
+
+EventSource cannot send an Authorization header, so the stream URL carries
+a ``stream_token`` instead of the JWT: signed, valid for one payment and
+PAYMENT_STREAM_TOKEN_SECONDS, so what lands in access logs is useless soon
+after and grants nothing else.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import connection, connections
+from django.db.models import F
+
+from .models import Payment
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'payment_status'
+STREAM_TOKEN_SALT = 'payments.status_stream'
+
+# Once a payment reaches one of these the stream sends it and ends
+SETTLED_PAYMENT_STATUSES = ('succeeded', 'cancelled', 'refunded')
+
+# Message sent to every subscriber after the listener reconnected: changes
+# may have been missed, so each stream re-reads its payment
+RESYNC = object()
+
+
+def notify_payment_status(*payment_ids):
+    """Announce that these payments changed (delivered on commit)."""
+    if not payment_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, payment_id) FROM unnest(%s::text[]) AS payment_id",
+            [CHANNEL, list(payment_ids)],
+        )
+
+
+class StatusHub:
+    """In-process fan-out of payment notifications to asyncio queues."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, payment_id):
+        """Return a queue that receives a message whenever ``payment_id`` changes."""
+        queue = asyncio.Queue()
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers[payment_id].add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name='payment-status-listener', daemon=True)
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, payment_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(payment_id, set())
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(payment_id, None)
+
+    def publish(self, payment_id, message=None):
+        with self._lock:
+            if payment_id is None:
+                targets = [s for subscribers in self._subscribers.values() for s in subscribers]
+            else:
+                targets = list(self._subscribers.get(payment_id, ()))
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message or payment_id)
+            except RuntimeError:
+                # The stream's event loop is gone
+                pass
+
+    def _listen(self):
+        reconnect = False
+        while True:
+            conn = None
+            try:
+                wrapper = connections['default']
+                conn = wrapper.get_new_connection(wrapper.get_connection_params())
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                if reconnect:
+                    self.publish(None, RESYNC)
+                logger.info("Listening for payment status notifications")
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.publish(conn.notifies.pop(0).payload)
+            except Exception as e:
+                logger.error(f"Payment status listener failed, reconnecting: {e}")
+                reconnect = True
+                time.sleep(1)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+hub = StatusHub()
+
+
+def stream_token(payment_id, user_id):
+    """A short-lived token opening the status stream of this payment for this user."""
+    return signing.TimestampSigner(salt=STREAM_TOKEN_SALT).sign(f"{user_id}:{payment_id}")
+
+
+def stream_token_user_id(token, payment_id):
+    """The id of the user a stream token was issued to, or None if it is invalid, expired or for another payment."""
+    try:
+        value = signing.TimestampSigner(salt=STREAM_TOKEN_SALT).unsign(
+            token, max_age=settings.PAYMENT_STREAM_TOKEN_SECONDS
+        )
+    except signing.BadSignature:
+        return None
+    user_id, _, token_payment_id = value.partition(':')
+    if token_payment_id != payment_id:
+        return None
+    return int(user_id)
+
+
+def payment_snapshot(payment_id, user_id):
+    """What the stream reports about a payment (one query), or None if not the user's."""
+    return Payment.objects.filter(payment_id=payment_id, user_id=user_id).values(
+        'payment_id', 'status', 'failure_reason',
+        order_number=F('order__order_number'),
+        order_status=F('order__status'),
+        is_paid=F('order__is_paid'),
+    ).first()
+
+
+def _event(snapshot):
+    return f"event: status\ndata: {json.dumps(snapshot)}\n\n"
+
+
+async def stream_events(payment_id, user_id):
+    """
+    Server-Sent Events for one checkout: the current status at once, then
+    every change, until the payment is settled or the stream has been open
+    PAYMENT_STREAM_MAX_SECONDS (EventSource reconnects by itself).
+    """
+    read = sync_to_async(payment_snapshot, thread_sensitive=False)
+    # Subscribe before the first read so no change can fall in between
+    queue = hub.subscribe(payment_id)
+    try:
+        yield f"retry: {settings.PAYMENT_STREAM_RETRY_MS}\n\n"
+        last = await read(payment_id, user_id)
+        if last is None:
+            return
+        yield _event(last)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.PAYMENT_STREAM_MAX_SECONDS
+        while last['status'] not in SETTLED_PAYMENT_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(queue.get(), timeout=min(settings.PAYMENT_STREAM_KEEPALIVE_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            current = await read(payment_id, user_id)
+            if current is None:
+                return
+            if current != last:
+                yield _event(current)
+                last = current
+    finally:
+        hub.unsubscribe(payment_id, queue)
@@ -0,0 +1,177 @@
+"""
+All calls to the Stripe API go through ``call()``::
+
+    from payments.stripe_client import call
+
+    intent = call('payment_intents', 'retrieve', intent_id)
+    intent = call('payment_intents', 'create', params={...}, idempotency_key=f"...")
+
+One ``stripe.StripeClient`` per process sends every request over a pooled
+``requests`` session with explicit connect/read timeouts, so a slow Stripe
+costs a worker thread at most STRIPE_CONNECT_TIMEOUT + STRIPE_READ_TIMEOUT
+per attempt instead of the library's 80 seconds. STRIPE_API_BASE points it
+at another server, such as the fake from run_fake_stripe.
+
+Transient failures (connection errors and timeouts, 409/429/5xx, or
+anything Stripe flags with ``Stripe-Should-Retry``) are retried up to
+STRIPE_MAX_RETRIES times with jittered exponential backoff. Every POST
+carries an idempotency key - the caller's, or one generated per call - that
+is reused across the retries, so a request that timed out after reaching
+Stripe is not applied twice.
+
+A circuit breaker shared by the threads of the process counts calls that
+still failed after their retries. After STRIPE_CIRCUIT_FAILURE_THRESHOLD
+failures in a row it opens: calls raise ``StripeUnavailable`` immediately
+for STRIPE_CIRCUIT_RESET_SECONDS, then a single trial call decides whether
+it closes again. Views turn ``StripeUnavailable`` into a 503.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class StripeUnavailable(Exception):
+    """Stripe is failing or the circuit is open; try again later."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open)."""
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        """Seconds until the next trial call is allowed (0 when closed)."""
+        with self._lock:
+            if self.opened_at is None:
+                return 0
+            return max(1, int(self.opened_at + self.reset_seconds - time.monotonic()) + 1)
+
+    def is_open(self):
+        """True while calls are being refused (no trial call is due yet)."""
+        with self._lock:
+            return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_seconds
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            # Half-open: let one call through to probe Stripe and keep the
+            # others out for another window (or until it succeeds)
+            self.opened_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Stripe circuit closed")
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.error(f"Stripe circuit open after {self.failures} failed calls")
+                self.opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(settings.STRIPE_CIRCUIT_FAILURE_THRESHOLD, settings.STRIPE_CIRCUIT_RESET_SECONDS)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide StripeClient (built on first use)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _client = stripe.StripeClient(
+                    settings.STRIPE_SECRET_KEY or '',
+                    base_addresses={'api': settings.STRIPE_API_BASE} if settings.STRIPE_API_BASE else {},
+                    http_client=stripe.RequestsClient(
+                        session=session,
+                        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+                    ),
+                    # Retries are done in call() so the breaker sees them
+                    max_network_retries=0,
+                )
+    return _client
+
+
+def _should_retry(error):
+    should_retry = (error.headers or {}).get('stripe-should-retry')
+    if should_retry is not None:
+        return should_retry == 'true'
+    if isinstance(error, (stripe.error.APIConnectionError, stripe.error.RateLimitError)):
+        return True
+    return error.http_status is not None and (error.http_status == 409 or error.http_status >= 500)
+
+
+def retry_delay(attempt):
+    """Jittered backoff before retry number ``attempt`` (1-based)."""
+    delay = min(settings.STRIPE_RETRY_BASE_DELAY * 2 ** (attempt - 1), settings.STRIPE_RETRY_MAX_DELAY)
+    return random.uniform(delay / 2, delay)
+
+
+def call(service, method, *args, params=None, idempotency_key=None):
+    """
+    Call ``client.<service>.<method>(*args, params=...)`` with retries,
+    idempotency and the circuit breaker. Stripe errors that are not
+    transient (card declined, invalid request...) are raised unchanged.
+    """
+    if not breaker.allow():
+        raise StripeUnavailable("Payment provider is temporarily unavailable", breaker.retry_after())
+
+    options = {}
+    if method not in ('retrieve', 'list'):
+        options['idempotency_key'] = idempotency_key or f"{service}-{method}-{uuid.uuid4()}"
+    function = getattr(getattr(get_client(), service), method)
+
+    attempt = 0
+    while True:
+        try:
+            result = function(*args, params=params or {}, options=options)
+        except stripe.error.StripeError as e:
+            if not _should_retry(e):
+                # Stripe answered; the request itself was wrong
+                breaker.record_success()
+                raise
+            if attempt < settings.STRIPE_MAX_RETRIES:
+                attempt += 1
+                delay = retry_delay(attempt)
+                logger.warning(f"Stripe {service}.{method} failed ({e.__class__.__name__}), retry {attempt} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            breaker.record_failure()
+            logger.error(f"Stripe {service}.{method} failed after {attempt + 1} attempts: {e}")
+            raise StripeUnavailable("Payment provider is temporarily unavailable", breaker.retry_after() or 1) from e
+
+        breaker.record_success()
+        return result
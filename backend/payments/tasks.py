@@ -0,0 +1,66 @@
+import logging
+from django.db import connection, transaction
+from django.utils import timezone
+from jobs.queue import task
+from .models import StripeEvent
+from .services import StripeService
+
+logger = logging.getLogger(__name__)
+
+# Attempts per event before it is marked failed and skipped (replay_stripe_events)
+STRIPE_EVENT_MAX_ATTEMPTS = 5
+
+
+@task(queue='stripe', max_attempts=STRIPE_EVENT_MAX_ATTEMPTS)
+def process_stripe_events(payment_intent_id='', event_id=None):
+    """
+    Apply the pending webhook events of one payment intent, oldest first.
+    Events that carry no payment intent are processed one at a time by id.
+
+    A failing event stops the run so later events of the same intent never
+    overtake it; the job is retried with backoff. After
+    STRIPE_EVENT_MAX_ATTEMPTS the event is marked failed and the rest go on.
+    """
+    events = StripeEvent.objects.filter(status='pending')
+    if payment_intent_id:
+        events = events.filter(payment_intent_id=payment_intent_id)
+    else:
+        events = events.filter(id=event_id)
+
+    error = None
+    with transaction.atomic():
+        # One processor per payment intent at a time, whichever worker runs it
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"stripe:{payment_intent_id or event_id}"])
+
+        for event in events.order_by('stripe_created_at', 'received_at', 'id'):
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    StripeService.handle_webhook_event(event.payload)
+            except Exception as e:
+                event.last_error = str(e)
+                if event.attempts < STRIPE_EVENT_MAX_ATTEMPTS:
+                    event.save(update_fields=['attempts', 'last_error'])
+                    error = e
+                    break
+                logger.error(f"Giving up on Stripe event {event.id} after {event.attempts} attempts: {e}")
+                event.status = 'failed'
+                event.save(update_fields=['attempts', 'last_error', 'status'])
+                continue
+
+            event.status = 'processed'
+            event.processed_at = timezone.now()
+            event.last_error = ''
+            event.save(update_fields=['attempts', 'status', 'processed_at', 'last_error'])
+
+    if error is not None:
+        # Raised after the commit so the attempt count above sticks
+        raise error
+
+
+def queue_stripe_event(event):
+    """Queue processing for a stored StripeEvent."""
+    if event.payment_intent_id:
+        return process_stripe_events.enqueue(payment_intent_id=event.payment_intent_id)
+    return process_stripe_events.enqueue(event_id=event.id)
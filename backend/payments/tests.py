@@ -1,3 +1,99 @@
-from django.test import TestCase
+import asyncio
+import json
+import select
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.db import connections
+from django.test import TransactionTestCase
+
+from orders.models import Order
+from users.models import User
+from .models import Payment
+from .services import StripeService
+from .status_stream import CHANNEL, StatusHub, payment_snapshot, stream_events
+
+
+class _TestHub(StatusHub):
+    """The real fan-out, fed by a LISTEN connection this test closes again."""
+
+    def __init__(self):
+        super().__init__()
+        self.stop = threading.Event()
+
+    def _listen(self):
+        wrapper = connections['default']
+        conn = wrapper.get_new_connection(wrapper.get_connection_params())
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            while not self.stop.is_set():
+                if select.select([conn], [], [], 0.1) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self.publish(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+
+class PaymentStatusStreamTests(TransactionTestCase):
+    """The status stream only ever reports a settled payment together with its paid order"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='p')
+        self.order = Order.objects.create(user=self.user, shipping_address='1 Main St', total_amount=10)
+        self.payment = Payment.objects.create(
+            order=self.order, user=self.user, amount=10, stripe_payment_intent_id='pi_stream'
+        )
+        self.hub = _TestHub()
+        for target, value in (('hub', self.hub), ('payment_snapshot', self._snapshot)):
+            patcher = mock.patch(f'payments.status_stream.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.hub.stop.set)
+
+    @staticmethod
+    def _snapshot(*args):
+        # Streams read on executor threads: close their connections so the
+        # test database can be dropped
+        try:
+            return payment_snapshot(*args)
+        finally:
+            connections.close_all()
+
+    def _stream_while(self, settle):
+        """Every snapshot streamed while ``settle`` runs in another thread."""
+        async def collect():
+            snapshots = []
+            async for chunk in stream_events(self.payment.payment_id, self.user.id):
+                if chunk.startswith('event: status'):
+                    snapshots.append(json.loads(chunk.split('data: ', 1)[1]))
+                    if len(snapshots) == 1:
+                        threading.Thread(target=settle).start()
+            return snapshots
+        return asyncio.run(asyncio.wait_for(collect(), timeout=10))
+
+    def test_succeeded_payment_is_streamed_with_its_paid_order(self):
+        change_status = Order.change_status
+
+        def slow_change_status(order, *args, **kwargs):
+            # Widen the window between the payment and the order update
+            time.sleep(0.5)
+            return change_status(order, *args, **kwargs)
+
+        def settle():
+            with mock.patch('payments.services.call', return_value=SimpleNamespace(status='succeeded')), \
+                    mock.patch.object(Order, 'change_status', slow_change_status):
+                StripeService.confirm_payment('pi_stream')
+            connections.close_all()
+
+        snapshots = self._stream_while(settle)
+
+        self.assertEqual(snapshots[0]['status'], 'pending')
+        self.assertEqual(snapshots[-1]['status'], 'succeeded')
+        self.assertTrue(snapshots[-1]['is_paid'])
+        self.assertEqual(snapshots[-1]['order_status'], 'confirmed')
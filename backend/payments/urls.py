@@ -5,6 +5,10 @@ urlpatterns = [
     path('create-payment-intent/', views.create_payment_intent, name='create_payment_intent'),
     path('confirm-payment/', views.confirm_payment, name='confirm_payment'),
     path('payment-status/<str:payment_id>/', views.payment_status, name='payment_status'),
+    path('payment-status/<str:payment_id>/stream/', views.payment_status_stream, name='payment_status_stream'),
+    path('payment-status/<str:payment_id>/stream-token/', views.payment_status_stream_token, name='payment_status_stream_token'),
     path('user-payments/', views.user_payments, name='user_payments'),
     path('stripe-config/', views.stripe_config, name='stripe_config'),
+    path('admin/refunds/', views.batch_refunds, name='batch_refunds'),
+    path('webhook/', views.stripe_webhook, name='stripe_webhook'),
 ]
@@ -1,26 +1,50 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
-from django.http import HttpResponse
+from django.views.decorators.http import require_GET, require_http_methods
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from datetime import datetime, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
 import stripe
 import json
 import logging
 
-from .models import Payment
+from .models import Payment, StripeEvent
 from .serializers import (
     PaymentSerializer, 
+    UserPaymentSerializer,
     CreatePaymentIntentSerializer, 
-    ConfirmPaymentSerializer
+    ConfirmPaymentSerializer,
+    BatchRefundSerializer
 )
+from .refunds import refund_batch
 from .services import StripeService
+from .status_stream import stream_events, stream_token, stream_token_user_id
+from .stripe_client import StripeUnavailable, breaker
+from .tasks import queue_stripe_event
 from orders.models import Order
+from orders.services import OrderService
+from users.authentication import CachedJWTAuthentication
 
 logger = logging.getLogger(__name__)
 
+
+def stripe_unavailable_response(error):
+    """503 telling the client when to retry a checkout while Stripe is down."""
+    response = Response(
+        {'error': str(error), 'retry_after': error.retry_after},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_payment_intent(request):
@@ -41,11 +65,17 @@ def create_payment_intent(request):
         
         order_id = serializer.validated_data['order_id']
         
+        # Fail fast while the Stripe circuit is open instead of building an
+        # order that cannot be paid
+        if breaker.is_open():
+            return stripe_unavailable_response(
+                StripeUnavailable("Payment provider is temporarily unavailable", breaker.retry_after())
+            )
+        created_order = False
+        
         # Handle cart checkout vs existing order
         if order_id == 'cart-checkout':
             # Check if user already has a pending payment for cart checkout
-            from django.db import transaction
-            
             # Look for existing pending payment for this user
             existing_payment = Payment.objects.filter(
                 user=request.user,
@@ -66,50 +96,41 @@ def create_payment_intent(request):
                 }, status=status.HTTP_200_OK)
             
             # Create order from cart items
-            from cart.models import CartItem, Cart
+            from cart.models import Cart
             
-            # Get or create cart for user
-            try:
-                cart = Cart.objects.get(user=request.user)
-                cart_items = CartItem.objects.filter(cart=cart)
-            except Cart.DoesNotExist:
+            cart = Cart.objects.filter(user=request.user).first()
+            if cart is None:
                 return Response(
                     {'error': 'No cart found for user'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            if not cart_items.exists():
+            lines = list(cart.items.values_list('product_id', 'quantity'))
+            if not lines:
                 return Response(
                     {'error': 'No items in cart'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Calculate total from cart
-            total_amount = sum(item.quantity * item.product.unit_price for item in cart_items)
-            
-            # Use atomic transaction to ensure order and items are created together
+            # Same order building and pricing (shipping, tax, promo) as
+            # PlaceOrderView. Cart checkouts do not take stock (stock_reserved
+            # stays False), neither now nor once paid.
             try:
-                with transaction.atomic():
-                    # Create order from cart
-                    order = Order.objects.create(
-                        user=request.user,
-                        total_amount=total_amount,
-                        status='pending',
-                        shipping_address=''  # Will be updated when order is confirmed
-                    )
-                    logger.info(f"Order created: {order.id} for user: {request.user.id}")
-                    
-                    # Add order items
-                    from orders.models import OrderItem
-                    for cart_item in cart_items:
-                        OrderItem.objects.create(
-                            order=order,
-                            product=cart_item.product,
-                            quantity=cart_item.quantity,
-                            price=cart_item.product.unit_price
-                        )
-                    logger.info(f"Created {cart_items.count()} order items for order: {order.id}")
-                    
+                order = OrderService.create_order(
+                    request.user,
+                    lines,
+                    promo_code=cart.promo_code,
+                    discount_amount=cart.discount_amount,
+                    reserve_stock=False,
+                    payment_method='stripe',
+                    shipping_address='',  # Will be updated when order is confirmed
+                )
+                created_order = True
+                logger.info(f"Order created: {order.id} with {len(lines)} items for user: {request.user.id}")
+            except ValueError as e:
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             except Exception as e:
                 logger.error(f"Error creating order and items: {e}")
                 return Response(
@@ -131,6 +152,12 @@ def create_payment_intent(request):
             logger.info(f"Creating payment intent for order: {order.id}, amount: {order.total_amount}")
             payment, intent = StripeService.create_payment_intent(order, request.user)
             logger.info(f"Payment intent created successfully: {payment.payment_id}")
+        except StripeUnavailable as e:
+            logger.error(f"Stripe unavailable, payment intent not created for order {order.id}: {e}")
+            if created_order:
+                # Nothing refers to it yet; the next attempt builds it again
+                order.delete()
+            return stripe_unavailable_response(e)
         except Exception as e:
             logger.error(f"Error creating payment intent: {e}")
             return Response(
@@ -218,6 +245,9 @@ def confirm_payment(request):
             {'error': 'Payment not found'},
             status=status.HTTP_404_NOT_FOUND
         )
+    except StripeUnavailable as e:
+        logger.error(f"Stripe unavailable confirming payment: {e}")
+        return stripe_unavailable_response(e)
     except Exception as e:
         logger.error(f"Error confirming payment: {e}")
         return Response(
@@ -232,7 +262,7 @@ def payment_status(request, payment_id):
     Get payment status
     """
     try:
-        payment = Payment.objects.get(
+        payment = Payment.objects.select_related('order').get(
             payment_id=payment_id,
             user=request.user
         )
@@ -252,24 +282,130 @@ def payment_status(request, payment_id):
             status=status.HTTP_404_NOT_FOUND
         )
 
+def _stream_user_id(request, payment_id):
+    """
+    The id of the user of a status stream request, from the usual Bearer
+    header or a ?stream_token= (the browser's EventSource cannot send headers).
+    """
+    token = request.GET.get('stream_token')
+    if token:
+        return stream_token_user_id(token, payment_id)
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return result[0].id if result else None
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def payment_status_stream_token(request, payment_id):
+    """
+    Issue a token for opening the payment's status stream with EventSource:
+    GET payment-status/<payment_id>/stream/?stream_token=<token>. It is valid
+    PAYMENT_STREAM_TOKEN_SECONDS; once the stream ends or fails, ask for a
+    new one before reconnecting.
+    """
+    if not Payment.objects.filter(payment_id=payment_id, user=request.user).exists():
+        return Response(
+            {'error': 'Payment not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return Response({
+        'stream_token': stream_token(payment_id, request.user.id),
+        'expires_in': settings.PAYMENT_STREAM_TOKEN_SECONDS,
+    }, status=status.HTTP_200_OK)
+
+@require_GET
+async def payment_status_stream(request, payment_id):
+    """
+    Stream a payment's status as Server-Sent Events instead of polling
+    payment-status: the current state first, then each change pushed by the
+    webhook, confirm_payment or reconciliation, until the payment settles.
+    See payments/status_stream.py. Only served over ASGI (backend/asgi.py);
+    under WSGI it answers 501 and clients poll payment-status instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Status streaming is not available on this server, poll payment-status instead'},
+            status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+    user_id = await sync_to_async(_stream_user_id)(request, payment_id)
+    if user_id is None:
+        return JsonResponse({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+    if not await Payment.objects.filter(payment_id=payment_id, user_id=user_id, user__is_active=True).aexists():
+        return JsonResponse({'error': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    response = StreamingHttpResponse(stream_events(payment_id, user_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+class UserPaymentsPagination(CursorPagination):
+    """Newest first; the cursor keeps pages stable while new payments arrive"""
+    ordering = '-created_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_payments(request):
     """
-    Get all payments for the current user
+    Get the current user's payments, newest first, a page at a time
+    (follow ``next`` for older ones), with the order number and status
     """
-    payments = Payment.objects.filter(user=request.user)
-    serializer = PaymentSerializer(payments, many=True)
+    payments = Payment.objects.filter(user=request.user).select_related('order')
+    paginator = UserPaymentsPagination()
+    page = paginator.paginate_queryset(payments, request)
+    serializer = UserPaymentSerializer(page, many=True)
     
     return Response({
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
         'payments': serializer.data
     }, status=status.HTTP_200_OK)
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def batch_refunds(request):
+    """
+    Refund many payments in one request.
+    
+    POST /api/payments/admin/refunds/
+    {"refunds": [{"payment_id": "PAY-...", "amount": "10.00", "reason": "requested_by_customer",
+                  "note": "...", "items": [{"order_item_id": 1, "quantity": 1}]}],
+     "retry_refund_ids": ["RF-..."]}
+    
+    - Partial refunds are recorded in the Refund ledger; refunded items go back in stock
+    - Stripe is called for several refunds concurrently (REFUND_BATCH_CONCURRENCY)
+    - Returns a result per refund: succeeded, failed, pending (Stripe unreachable,
+      resubmit it with retry_refund_ids) or rejected
+    """
+    serializer = BatchRefundSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    results = refund_batch(
+        serializer.validated_data['refunds'],
+        retry_refund_ids=serializer.validated_data['retry_refund_ids'],
+        created_by=request.user,
+    )
+    succeeded = sum(1 for result in results if result['status'] == 'succeeded')
+    return Response({
+        'message': f'{succeeded} of {len(results)} refunds succeeded',
+        'succeeded_count': succeeded,
+        'results': results,
+    }, status=status.HTTP_200_OK)
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def stripe_webhook(request):
     """
-    Handle Stripe webhook events
+    Receive Stripe webhook events.
+    The verified event is stored and queued, then acknowledged straight away;
+    payments.tasks applies it in the background. Redelivered events are
+    recognised by their id and acknowledged without queueing them again.
     """
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
@@ -278,27 +414,41 @@ def stripe_webhook(request):
     try:
         if endpoint_secret:
             # Verify webhook signature
-            event = stripe.Webhook.construct_event(
-                payload, sig_header, endpoint_secret
-            )
+            stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
+        elif not settings.DEBUG:
+            logger.error("STRIPE_WEBHOOK_SECRET is not set; refusing unverified webhook")
+            return HttpResponse(status=400)
+        event = json.loads(payload)
+        event_object = event['data']['object']
+        if event_object.get('object') == 'payment_intent':
+            payment_intent_id = event_object.get('id')
         else:
-            # For development - parse without verification
-            event = json.loads(payload)
-        
-        # Handle the event
-        StripeService.handle_webhook_event(event)
-        
-        return HttpResponse(status=200)
-        
-    except ValueError:
+            payment_intent_id = event_object.get('payment_intent')
+        stripe_event = StripeEvent(
+            id=event['id'],
+            type=event['type'],
+            payment_intent_id=payment_intent_id or '',
+            payload=event,
+            stripe_created_at=datetime.fromtimestamp(event['created'], tz=dt_timezone.utc),
+        )
+    except (ValueError, KeyError, TypeError, AttributeError):
         logger.error("Invalid payload in webhook")
         return HttpResponse(status=400)
     except stripe.error.SignatureVerificationError:
         logger.error("Invalid signature in webhook")
         return HttpResponse(status=400)
+    
+    try:
+        with transaction.atomic():
+            stripe_event.save(force_insert=True)
+            queue_stripe_event(stripe_event)
+    except IntegrityError:
+        logger.info(f"Duplicate webhook event {stripe_event.id}, already received")
     except Exception as e:
-        logger.error(f"Error processing webhook: {e}")
+        logger.error(f"Error storing webhook event: {e}")
         return HttpResponse(status=500)
+    
+    return HttpResponse(status=200)
 
 @api_view(['GET'])
 @permission_classes([])  # Allow unauthenticated access
@@ -0,0 +1,126 @@
+"""
+Password hashing off the event loop, with admission control.
+
+Signup, login and password reset spend most of their time in PBKDF2.
+Under ASGI a sync view runs on Django's shared sync thread, so a burst of
+logins would queue every other sync view behind the hashing. ``offload()``
+turns such a view into an async one that runs it on a dedicated pool of
+PASSWORD_HASH_WORKERS threads (hashlib's PBKDF2 releases the GIL, so the
+threads hash in parallel on separate cores).
+
+At most PASSWORD_HASH_QUEUE_LIMIT requests wait for a free worker. Beyond
+that the endpoint answers 429 with a Retry-After header at once instead of
+queueing, so a login storm cannot starve catalog traffic.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+logger = logging.getLogger(__name__)
+
+
+class HashingPoolBusy(Exception):
+    """Every worker is busy and the queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__("Password hashing pool is saturated")
+        self.retry_after = retry_after
+
+
+class HashingPool:
+    """A bounded thread pool: ``workers`` running plus ``queue_limit`` waiting."""
+
+    def __init__(self, workers, queue_limit):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # Moving average of a job's duration, for Retry-After
+        self._average_seconds = 0.1
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            return self._executor
+
+    def retry_after(self):
+        """Seconds until the queue has drained, roughly (at least 1)."""
+        with self._lock:
+            return max(1, math.ceil(self._in_flight / self.workers * self._average_seconds))
+
+    def _run(self, function, args, kwargs):
+        started = time.perf_counter()
+        # Pool threads live outside the request cycle: manage their
+        # connection like Django does around a request
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._average_seconds = 0.8 * self._average_seconds + 0.2 * elapsed
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    async def run(self, function, *args, **kwargs):
+        """Run ``function`` in the pool; raises HashingPoolBusy when saturated."""
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolBusy(self.retry_after())
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._get_executor().submit(self._run, function, args, kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        # Released when the job finishes, or is cancelled before it starts,
+        # even if the client went away in between
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+
+pool = HashingPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_LIMIT)
+
+
+def offload(view):
+    """
+    Async version of the sync ``view``, run in the hashing pool;
+    429 with Retry-After while the pool is saturated.
+    """
+    @csrf_exempt
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        try:
+            return await pool.run(_render, view, request, *args, **kwargs)
+        except HashingPoolBusy as e:
+            logger.warning(f"Rejected {request.path}: password hashing pool saturated")
+            response = JsonResponse(
+                {'error': 'busy', 'message': 'Too many requests, please try again shortly', 'retry_after': e.retry_after},
+                status=429
+            )
+            response['Retry-After'] = str(e.retry_after)
+            return response
+    return async_view
+
+
+def _render(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    # DRF responses are rendered lazily; do it here rather than on the event loop
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    return response
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 import re
 
 User = get_user_model()
@@ -77,4 +78,16 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
             raise serializers.ValidationError({
                 "password_confirm": "Passwords do not match"
             })
-        return data
\ No newline at end of file
+        return data
+
+
+class TokenObtainPairWithClaimsSerializer(TokenObtainPairSerializer):
+    """
+    Login tokens that also carry ``is_staff``, so TokenUserAuthentication
+    can answer without loading the user
+    """
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['is_staff'] = user.is_staff
+        return token
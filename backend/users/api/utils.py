@@ -1,11 +1,11 @@
-from django.core.mail import send_mail
+from outbox.mail import queue_email
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
 
 
 def send_verification_email(user):
-    """Send email verification email to user"""
+    """Queue the email verification email for a user (sent by run_mail_worker)"""
     subject = 'Verify your Amazon Clone account'
     
     # Create verification URL - ensure no double slashes
@@ -119,23 +119,17 @@ def send_verification_email(user):
     The Amazon Clone Team
     """
     
-    try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        return True
-    except Exception as e:
-        print(f"Failed to send verification email: {e}")
-        return False
+    return queue_email(
+        subject=subject,
+        message=plain_message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[user.email],
+        html_message=html_message,
+    )
 
 
 def send_password_reset_email(user):
-    """Send password reset email to user"""
+    """Queue the password reset email for a user (sent by run_mail_worker)"""
     subject = 'Reset your Amazon Clone password'
     
     # Create password reset URL - ensure no double slashes
@@ -249,16 +243,10 @@ def send_password_reset_email(user):
     The Amazon Clone Team
     """
     
-    try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        return True
-    except Exception as e:
-        print(f"Failed to send password reset email: {e}")
-        return False
\ No newline at end of file
+    return queue_email(
+        subject=subject,
+        message=plain_message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[user.email],
+        html_message=html_message,
+    )
\ No newline at end of file
@@ -0,0 +1,91 @@
+"""
+JWT authentication without a users_user query on every request.
+
+``CachedJWTAuthentication`` (the default authentication class) keeps the
+User rows it loads in a per-process cache for JWT_USER_CACHE_TTL seconds,
+keyed by user id and the token's issue time. Saving or deleting a user
+drops their entries in this process; other processes see the change once
+their entry expires, so keep the TTL short.
+
+``TokenUserAuthentication`` builds a TokenUser from the token's claims
+(``user_id``, ``is_staff``) without touching the database at all. It does
+not notice deactivation before the access token expires, so only use it
+on cheap read endpoints that need nothing but the user's id.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+class UserCache:
+    """Thread-safe TTL cache of User instances; hands out copies."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+        # A copy: views may modify request.user
+        return copy.copy(user)
+
+    def set(self, key, user):
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                while len(self._entries) >= self.max_entries:
+                    # Oldest first (dicts keep insertion order)
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = (now + self.ttl, copy.copy(user))
+
+    def invalidate(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(settings.JWT_USER_CACHE_TTL, settings.JWT_USER_CACHE_MAX_ENTRIES)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that reuses recently loaded users (see module docstring)."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        key = (str(user_id), validated_token.get('iat'))
+        user = user_cache.get(key)
+        if user is None:
+            # Raises for unknown and inactive users, which are never cached
+            user = super().get_user(validated_token)
+            user_cache.set(key, user)
+        return user
+
+
+class TokenUserAuthentication(JWTStatelessUserAuthentication):
+    """request.user is a TokenUser built from the token's claims (no query)."""
@@ -0,0 +1,89 @@
+import time
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from users.api.backends import CustomAuthBackend
+from users.api.views import CustomTokenObtainPairView
+from users.models import User
+
+EMAIL = 'benchmark-login@example.invalid'
+PASSWORD = 'Benchmark!password1'
+
+
+def _legacy_login(request, email, password):
+    """The login flow before the single-hash view: backend check, then the serializer's own check."""
+    user = CustomAuthBackend().authenticate(request, username=email, password=password)
+    if user is None:
+        # The old view looked the user up again to pick the error message
+        User.objects.get(email=email)
+        return 401
+    serializer = TokenObtainPairSerializer(data={'email': email, 'password': password}, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    return 200
+
+
+class Command(BaseCommand):
+    """
+    Compare login throughput of the previous flow (password hash checked
+    twice per successful login) with CustomTokenObtainPairView, on one
+    thread, i.e. logins per second per core. A throwaway user is created
+    inside a transaction that is rolled back.
+
+    Usage:
+        python manage.py benchmark_login
+        python manage.py benchmark_login --seconds 10
+    """
+    help = 'Benchmark logins per second per core, before and after the single-hash login view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5, help='Time spent on each flow')
+
+    def handle(self, *args, **options):
+        hasher = get_hasher()
+        self.stdout.write(f"Password hasher: {hasher.algorithm} ({getattr(hasher, 'iterations', 'n/a')} iterations)")
+
+        factory = APIRequestFactory()
+        view = CustomTokenObtainPairView.as_view()
+
+        def current(password):
+            request = factory.post('/api/auth/login/', {'email': EMAIL, 'password': password}, format='json')
+            return view(request).status_code
+
+        def legacy(password):
+            request = factory.post('/api/auth/login/', {'email': EMAIL, 'password': password}, format='json')
+            return _legacy_login(request, EMAIL, password)
+
+        with transaction.atomic():
+            user = User(username='benchmark-login', email=EMAIL, is_email_verified=True)
+            user.set_password(PASSWORD)
+            user.save()
+
+            results = {}
+            for name, login in (('before', legacy), ('after', current)):
+                if login(PASSWORD) != 200:
+                    raise CommandError(f"{name}: login failed")
+                with CaptureQueriesContext(connection) as ok_queries:
+                    login(PASSWORD)
+                with CaptureQueriesContext(connection) as bad_queries:
+                    if login('wrong-password') != 401:
+                        raise CommandError(f"{name}: wrong password was accepted")
+
+                count = 0
+                started = time.perf_counter()
+                deadline = started + options['seconds']
+                while time.perf_counter() < deadline:
+                    login(PASSWORD)
+                    count += 1
+                rate = count / (time.perf_counter() - started)
+                results[name] = rate
+                self.stdout.write(
+                    f"{name}: {rate:,.1f} logins/s per core, "
+                    f"{len(ok_queries)} queries per login, {len(bad_queries)} per wrong password"
+                )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {results['after'] / results['before']:.2f}x"))
@@ -24,6 +24,20 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'  # Still use email for login
     REQUIRED_FIELDS = ['username']  # Username will be required when creating superuser
 
+    # Copied into Order.search_text; orders.signals refreshes the orders
+    # only when one of them changed since the user was loaded
+    ORDER_SEARCH_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._order_search_state = instance.order_search_state()
+        return instance
+
+    def order_search_state(self):
+        """The loaded values of ORDER_SEARCH_FIELDS (None for deferred ones)"""
+        return tuple(self.__dict__.get(field) for field in self.ORDER_SEARCH_FIELDS)
+
     def generate_verification_token(self):
         """Generate a new verification token"""
         self.email_verification_token = uuid.uuid4()
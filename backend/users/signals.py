@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .authentication import user_cache
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    """Forget the authenticated-user cache entries of a changed user (profile, password, is_active...)"""
+    user_id = instance.pk
+    # After the commit, so a concurrent request cannot cache the old row again
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))